@@ -1,28 +1,13 @@
 import streamlit as st
-from src.game_engine import GameEngine
-from src.config import ChatConfig, ChatProvider
+from src.app_resources import configure_process, get_config, get_manager
+from src.config import ChatConfig
+from src.message_archive import MessageArchive
 from datetime import datetime
 from langchain_core.messages import AIMessage, HumanMessage
 import logging
-from typing import List
-from dotenv import load_dotenv
+from typing import List, Optional
 import os
-
-# Load environment variables
-load_dotenv()
-
-# Configure logging to write to a file
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('game_debug.log'),
-        logging.StreamHandler()  # This will also show logs in terminal
-    ]
-)
- 
-# Add a test log message to verify logging is working
-logging.debug("Streamlit app started")
+import tempfile
 
 # Page config
 st.set_page_config(
@@ -31,9 +16,25 @@ st.set_page_config(
     layout="wide"
 )
 
+# Environment, logging and the session manager are set up once per server
+# process; st.session_state only holds per-player state
+configure_process()
+session_manager = get_manager()
+
+# Every message shown to a player is archived on disk; only the latest
+# page is drawn on each rerun and older pages are loaded on request
+ARCHIVE_DIR = os.getenv('GAME_ARCHIVE_DIR', os.path.join(tempfile.gettempdir(), "ai-adventure-archive"))
+PAGE_SIZE = 20
+
 # Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []  
+if "archive" not in st.session_state:
+    st.session_state.archive = None
+if "older_pages" not in st.session_state:
+    # Pages loaded before the latest one
+    st.session_state.older_pages = 0
+if "rendered_pages" not in st.session_state:
+    # Page number -> (messages on the page, HTML)
+    st.session_state.rendered_pages = {}
 if "openai_api_key" not in st.session_state:
     st.session_state.openai_api_key = None
 if "game_active" not in st.session_state:
@@ -42,6 +43,38 @@ if "use_free_version" not in st.session_state:
     st.session_state.use_free_version = False
 if "turn_counter" not in st.session_state:
     st.session_state.turn_counter = 0
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+
+
+def build_config() -> ChatConfig:
+    """Chat configuration for the player's current settings"""
+    use_free_version = st.session_state.use_free_version
+    return get_config(use_free_version, None if use_free_version else st.session_state.openai_api_key)
+
+
+def get_archive(session_id: str) -> MessageArchive:
+    """The message archive of a session, opened once per player"""
+    archive = st.session_state.archive
+    path = os.path.join(ARCHIVE_DIR, f"{session_id}.jsonl")
+    if archive is None or archive.path != path:
+        archive = MessageArchive(path, page_size=PAGE_SIZE)
+        st.session_state.archive = archive
+        st.session_state.older_pages = 0
+        st.session_state.rendered_pages = {}
+    return archive
+
+
+game_engine = None
+if st.session_state.session_id:
+    game_engine = session_manager.get_session(st.session_state.session_id)
+    if game_engine is None and st.session_state.game_active:
+        try:
+            game_engine = session_manager.resume_session(build_config(), st.session_state.session_id)
+        except ValueError as e:
+            logging.error(f"Could not resume session {st.session_state.session_id}: {str(e)}")
+            st.session_state.game_active = False
+            st.warning("Your game session expired. Start a new game to keep playing.")
 
 # Custom CSS
 st.markdown("""
@@ -94,21 +127,18 @@ with st.sidebar:
         if st.button("New Game"):
             logging.debug("=== Starting New Game ===")
             # Initialize game engine with appropriate config
-            config = ChatConfig(
-                provider=ChatProvider.LLAMA if st.session_state.use_free_version else ChatProvider.OPENAI,
-                max_history=30,
-                api_key=None if st.session_state.use_free_version else st.session_state.openai_api_key,
-                base_url=os.getenv('PARASAIL_BASE_URL') if st.session_state.use_free_version else None
-            )
-            st.session_state.game_engine = GameEngine(config)
+            st.session_state.session_id, game_engine = session_manager.create_session(
+                build_config(), session_id=st.session_state.session_id)
             
-            # Initialize game to show character options only
-            game_init = st.session_state.game_engine.initialize_game()
+            # Offer the character options; the player's reply starts the story
+            options_text = game_engine.offer_options()
             
             # Reset UI state and show only the character selection prompt
-            st.session_state.messages = [
-                AIMessage(content=game_init["options"])
-            ]
+            archive = get_archive(st.session_state.session_id)
+            archive.clear()
+            archive.append(AIMessage(content=options_text))
+            st.session_state.older_pages = 0
+            st.session_state.rendered_pages = {}
             st.session_state.game_active = True
             
             # Reset turn counter when starting new game
@@ -117,12 +147,12 @@ with st.sidebar:
         st.info("Please either enable the free version or enter your OpenAI API key to start the game.")
 
     # Display turn counter in sidebar
-    if st.session_state.game_active:
+    if st.session_state.game_active and game_engine is not None:
         st.metric("Turn", st.session_state.turn_counter)
         
         # Add token statistics
-        if hasattr(st.session_state.game_engine, "get_token_stats"):
-            stats = st.session_state.game_engine.get_token_stats()
+        if hasattr(game_engine, "get_token_stats"):
+            stats = game_engine.get_token_stats()
             st.write("### Token Usage")
             col1, col2 = st.columns(2)
             with col1:
@@ -131,22 +161,64 @@ with st.sidebar:
             with col2:
                 st.metric("Total Tokens", stats["total_tokens"])
                 st.metric("Est. Cost ($)", stats["estimated_cost"])
+            if stats.get("by_chain"):
+                with st.expander("Usage by chain"):
+                    # A markdown table; st.table converts to a DataFrame on every rerun
+                    rows = "".join(f"| {chain} | {usage['total_tokens']} | {usage['estimated_cost']} |\n"
+                                   for chain, usage in stats["by_chain"].items())
+                    st.markdown("| Chain | Tokens | Cost ($) |\n|---|---:|---:|\n" + rows)
+
+        # Show how long narration and state extraction take per turn
+        if hasattr(game_engine, "get_timing_stats"):
+            timings = game_engine.get_timing_stats()
+            st.write("### Turn Timing")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Story (s)", timings.get("story", {}).get("average", 0.0))
+            with col2:
+                st.metric("State (s)", timings.get("state", {}).get("average", 0.0))
+            if not game_engine.state_is_fresh:
+                st.caption("Game state is still updating in the background.")
+
+def message_html(content: str, is_ai: bool) -> str:
+    """Wrap message content in the chat bubble markup"""
+    div_class = "ai-message" if is_ai else "user-message"
+    return f"""
+        <div class="message-container {div_class}">
+            {content}
+        </div>
+    """
+
+def render_page(archive: MessageArchive, number: int) -> str:
+    """HTML of one page of messages, rendered again only when the page grows"""
+    size = min(archive.page_size, len(archive) - number * archive.page_size)
+    cached = st.session_state.rendered_pages.get(number)
+    if cached is not None and cached[0] == size:
+        return cached[1]
+    rendered = "".join(message_html(message.content, isinstance(message, AIMessage))
+                       for message in archive.page(number))
+    st.session_state.rendered_pages[number] = (size, rendered)
+    return rendered
+
+def load_older_page() -> None:
+    st.session_state.older_pages += 1
 
 # Message display area
+archive: Optional[MessageArchive] = None
+if st.session_state.session_id:
+    archive = get_archive(st.session_state.session_id)
+
 message_container = st.container()
 with message_container:
-    for message in st.session_state.messages:
-        is_ai = isinstance(message, AIMessage)
-        div_class = "ai-message" if is_ai else "user-message"
-        with st.container():
-            st.markdown(f"""
-                <div class="message-container {div_class}">
-                    {message.content}
-                </div>
-            """, unsafe_allow_html=True)
+    if archive is not None:
+        first_page = archive.first_visible_page(st.session_state.older_pages)
+        if first_page > 0:
+            st.button("Show earlier messages", on_click=load_older_page)
+        for number in range(first_page, archive.page_count):
+            st.markdown(render_page(archive, number), unsafe_allow_html=True)
 
 # Game input form
-if st.session_state.game_active and "game_engine" in st.session_state:
+if st.session_state.game_active and game_engine is not None:
     with st.form(key="user_input_form", clear_on_submit=True):
         user_input = st.text_input("Your response:")
         submit = st.form_submit_button("Send")
@@ -158,17 +230,22 @@ if st.session_state.game_active and "game_engine" in st.session_state:
             st.session_state.turn_counter += 1
             
             # Add user message to UI
-            st.session_state.messages.append(HumanMessage(content=user_input)) # type: ignore
+            archive.append(HumanMessage(content=user_input))
             
+            # Show the player's message and stream the narration below it
+            with message_container:
+                st.markdown(message_html(user_input, is_ai=False), unsafe_allow_html=True)
+                response_placeholder = st.empty()
+
             # Process turn using game engine
             try:
-                ai_response = st.session_state.game_engine.process_turn(user_input)
-                st.session_state.messages.append(AIMessage(content=ai_response))
-                
-                # Keep UI messages in sync with max history
-                if len(st.session_state.messages) > st.session_state.game_engine.config.max_history:
-                    st.session_state.messages = st.session_state.messages[-(st.session_state.game_engine.config.max_history):]
-                
+                ai_response = ""
+                for chunk in game_engine.stream_turn(user_input):
+                    ai_response += chunk
+                    response_placeholder.markdown(message_html(ai_response, is_ai=True),
+                                                  unsafe_allow_html=True)
+                archive.append(AIMessage(content=ai_response))
+
             except Exception as e:
                 logging.error(f"Error processing turn: {str(e)}", exc_info=True)
                 st.error("An error occurred while processing your input. Please try again.")
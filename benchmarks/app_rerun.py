@@ -0,0 +1,156 @@
+"""Benchmark: per-rerun overhead of the Streamlit app.
+
+Streamlit re-executes ``app.py`` from the top on every click, so anything
+done at module level is paid on every rerun. This runs the app with
+Streamlit's ``AppTest`` and times reruns in three states: the landing page,
+a game in progress and a game with a long history. Games are played on the
+mock provider so no API key is needed.
+
+``AppTest`` recompiles the script on every run, which adds a few
+milliseconds per rerun that a server does not pay, so the time spent
+executing the script itself is reported separately (``script``); compare
+runs of this benchmark against each other rather than against production
+latencies.
+
+Run with:
+    python -m benchmarks.app_rerun
+    python -m benchmarks.app_rerun --app /tmp/app_before.py
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from streamlit.runtime.scriptrunner import script_runner
+from streamlit.testing.v1 import AppTest
+
+from src.config import ChatConfig, ChatProvider
+from src.message_archive import MessageArchive
+from src.session_manager import get_session_manager
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Roughly the size of a narration from gpt-4o-mini
+NARRATION = "The mist curls between the ancient trees as you step forward. " * 12
+
+
+def build_history(turns: int) -> List[BaseMessage]:
+    """The option menu followed by ``turns`` player/narrator exchanges"""
+    messages: List[BaseMessage] = [AIMessage(content="Choose your character: 1, 2 or 3")]
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"I follow the path ({turn})"))
+        messages.append(AIMessage(content=NARRATION))
+    return messages
+
+
+def start_game(history_turns: int, archive_dir: str) -> Dict[str, object]:
+    """Start a mock game and return the session state a player would have"""
+    config = ChatConfig(provider=ChatProvider.MOCK, option_pool_size=0, cache_backend=None)
+    session_id, engine = get_session_manager().create_session(config)
+    engine.offer_options()
+    engine.start_story("1")
+    engine.wait_for_state()
+
+    history = build_history(history_turns)
+    archive = MessageArchive(os.path.join(archive_dir, f"{session_id}.jsonl"))
+    for message in history:
+        archive.append(message)
+    return {
+        "session_id": session_id,
+        "game_active": True,
+        "turn_counter": history_turns,
+        # Read by versions of the app that keep the history in session state
+        "messages": history
+    }
+
+
+class ScriptTimer:
+    """Times each execution of the script body inside Streamlit's script runner"""
+
+    def __init__(self):
+        self.timings: List[float] = []
+        self._exec = script_runner.exec_func_with_error_handling
+
+    def __enter__(self) -> "ScriptTimer":
+        def timed_exec(func, ctx):
+            started = time.perf_counter()
+            try:
+                return self._exec(func, ctx)
+            finally:
+                self.timings.append(time.perf_counter() - started)
+        script_runner.exec_func_with_error_handling = timed_exec
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        script_runner.exec_func_with_error_handling = self._exec
+
+
+def percentiles(timings: List[float]) -> Dict[str, float]:
+    """p50 and p95 in milliseconds"""
+    timings = sorted(timings)
+    return {
+        "p50": round(statistics.median(timings) * 1000, 2),
+        "p95": round(timings[int(0.95 * (len(timings) - 1))] * 1000, 2)
+    }
+
+
+def time_reruns(app: str, state: Optional[Dict[str, object]], reruns: int) -> Dict[str, float]:
+    """Wall time of a rerun and of the script body, after the first run"""
+    test = AppTest.from_file(app, default_timeout=60)
+    for key, value in (state or {}).items():
+        test.session_state[key] = value
+    test.run()
+    if test.exception:
+        raise RuntimeError(f"{app} failed: {test.exception[0].message}")
+    timings = []
+    with ScriptTimer() as script:
+        for _ in range(reruns):
+            started = time.perf_counter()
+            test.run()
+            timings.append(time.perf_counter() - started)
+    return {
+        "rerun": percentiles(timings),
+        "script": percentiles(script.timings),
+        "elements": len(test.markdown)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=str(ROOT / "app.py"), help="Streamlit script to measure")
+    parser.add_argument("--turns", type=int, default=500, help="Turns of history in the long game")
+    parser.add_argument("--reruns", type=int, default=30, help="Timed reruns per scenario")
+    args = parser.parse_args(argv)
+
+    # Prompt templates are found relative to the repository root
+    os.chdir(ROOT)
+    # Keep the benchmark's message archives out of the working tree
+    workdir = tempfile.mkdtemp(prefix="app-rerun-")
+    os.environ["GAME_ARCHIVE_DIR"] = workdir
+    app = str(Path(args.app).resolve())
+
+    scenarios = {
+        "landing": None,
+        "game": start_game(5, workdir),
+        f"game_{args.turns}_turns": start_game(args.turns, workdir)
+    }
+    print(f"{'scenario':>16}  {'rerun p50':>9}  {'rerun p95':>9}  {'script p50':>10}  {'script p95':>10}  "
+          f"{'markdown':>8}   (ms)")
+    for name, state in scenarios.items():
+        result = time_reruns(app, state, args.reruns)
+        rerun, script = result["rerun"], result["script"]
+        print(f"{name:>16}  {rerun['p50']:>9}  {rerun['p95']:>9}  {script['p50']:>10}  {script['p95']:>10}  "
+              f"{result['elements']:>8}")
+    get_session_manager().close()
+    logging.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Benchmark: engine overhead, prompt growth and memory over scripted sessions.
+
+Drives GameEngine through scripted sessions against the offline mock
+provider, behind the same scheduler, retry/circuit breaker and completion
+cache layers as a real provider, and reports, per session length:
+
+- game start cost (offer_options + start_story), excluding provider time
+- per-turn engine overhead on the player's critical path, excluding provider time
+- story prompt tokens per turn
+- time spent in ``_format_conversation_history``
+- resident memory growth over the session
+
+Results are printed as a table and can be written as JSON, saved as the
+baseline or compared against it. Timings are machine dependent, so compare
+against a baseline recorded on the same machine.
+
+Run with:
+    python -m benchmarks.engine_sessions
+    python -m benchmarks.engine_sessions --compare benchmarks/baseline.json
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from routers.chat_mock import ChatMock
+from src.config import ChatConfig, ChatProvider
+from src.context import TokenCounter
+from src.game_engine import GameEngine
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+PLAYER_INPUTS = [
+    "I follow the glowing path towards the waterfall.",
+    "I ask the old woman about the missing lantern.",
+    "Search the room for anything useful.",
+    "2",
+    "I draw my dagger and step into the dark corridor.",
+]
+
+# Metrics compared against the baseline, and whether they are timings
+# (compared with the timing tolerance) or deterministic counts
+TRACKED_METRICS = {
+    "start_overhead_ms": True,
+    "turn_overhead_ms_p50": True,
+    "turn_overhead_ms_p95": True,
+    "format_history_us_mean": True,
+    "prompt_tokens_mean": False,
+    "prompt_tokens_last": False,
+    "rss_growth_mb": False,
+}
+
+
+_provider_calls = threading.local()
+# Counted with the character estimate, like the engine on the mock provider, so
+# the token metrics are the same whether or not tiktoken's encodings are cached
+_prompt_counter = TokenCounter(ChatMock.SUPPORTED_MODELS[0], use_tokenizer=False)
+
+
+class TimedMock(ChatMock):
+    """Mock provider that records, per thread, its time and prompt sizes.
+
+    Prompt tokens are counted inside the timed section so that counting is
+    not charged to the engine.
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            _provider_calls.last_prompt_tokens = _prompt_counter.count_messages(messages)
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        finally:
+            _provider_calls.seconds = provider_seconds() + time.perf_counter() - started
+
+
+def provider_seconds() -> float:
+    """Provider time recorded by the calling thread so far"""
+    return getattr(_provider_calls, "seconds", 0.0)
+
+
+class BenchmarkConfig(ChatConfig):
+    """Chat configuration that serves the timed mock provider.
+
+    Only the innermost chat model is replaced, so the provider wrappers
+    (scheduler, retries, cache) are built as usual and their overhead
+    counts towards the engine's.
+    """
+
+    def _create_provider(self, provider: ChatProvider, **kwargs):
+        if provider != ChatProvider.MOCK:
+            return super()._create_provider(provider, **kwargs)
+        return TimedMock(model_name=self.get_model_name(provider), **{**self.mock_options, **kwargs})
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def run_session(turns: int, seed: int = 0) -> Dict[str, Any]:
+    """Play one scripted session and collect its metrics"""
+    config = BenchmarkConfig(
+        provider=ChatProvider.MOCK,
+        option_pool_size=0,
+        # The mock has no rate limit; a generous one puts the scheduler on the call path
+        rate_limits={ChatProvider.MOCK: {"requests_per_minute": 10 ** 6, "tokens_per_minute": 10 ** 9}},
+        mock_options={"seed": seed}
+    )
+    gc.collect()
+    rss_before = rss_mb()
+    engine = GameEngine(config)
+
+    # Time spent formatting the history for the story prompt
+    format_times: List[float] = []
+    format_history = engine._format_conversation_history
+
+    def timed_format_history(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return format_history(*args, **kwargs)
+        finally:
+            format_times.append(time.perf_counter() - started)
+
+    engine._format_conversation_history = timed_format_history
+
+    prompt_tokens: List[int] = []
+    try:
+        wall, provider = time.perf_counter(), provider_seconds()
+        engine.offer_options()
+        engine.start_story("1")
+        start_overhead = (time.perf_counter() - wall) - (provider_seconds() - provider)
+        engine.wait_for_state()
+
+        overheads = []
+        for turn in range(turns):
+            wall, provider = time.perf_counter(), provider_seconds()
+            engine.process_turn(PLAYER_INPUTS[turn % len(PLAYER_INPUTS)])
+            overheads.append((time.perf_counter() - wall) - (provider_seconds() - provider))
+            # The story call is the only provider call on this thread during a turn
+            prompt_tokens.append(_provider_calls.last_prompt_tokens)
+            # Keep background state extraction from piling up between turns
+            engine.wait_for_state()
+    finally:
+        engine.close()
+    rss_after = rss_mb()
+
+    return {
+        "turns": turns,
+        "start_overhead_ms": round(start_overhead * 1e3, 3),
+        "turn_overhead_ms_p50": round(percentile(overheads, 50) * 1e3, 3),
+        "turn_overhead_ms_p95": round(percentile(overheads, 95) * 1e3, 3),
+        "format_history_us_mean": round(statistics.fmean(format_times) * 1e6, 2) if format_times else 0.0,
+        "prompt_tokens_mean": round(statistics.fmean(prompt_tokens), 1) if prompt_tokens else 0.0,
+        "prompt_tokens_last": prompt_tokens[-1] if prompt_tokens else 0,
+        "rss_growth_mb": round(rss_after - rss_before, 1),
+    }
+
+
+def run(lengths: List[int], seed: int = 0, repeat: int = 3) -> List[Dict[str, Any]]:
+    """Run each session length ``repeat`` times and keep the median of every metric"""
+    # Load templates, tokenizer and LangChain internals before measuring
+    run_session(3, seed)
+    results = []
+    for turns in lengths:
+        runs = [run_session(turns, seed) for _ in range(repeat)]
+        results.append({metric: statistics.median(row[metric] for row in runs) for metric in runs[0]})
+    return results
+
+
+def compare(results: List[Dict[str, Any]],
+            baseline: List[Dict[str, Any]],
+            tolerance: float,
+            memory_tolerance_mb: float) -> List[str]:
+    """Compare results against a baseline.
+
+    Returns:
+        Descriptions of the metrics that regressed beyond the tolerance
+    """
+    regressions = []
+    baseline_by_turns = {row["turns"]: row for row in baseline}
+    for row in results:
+        reference = baseline_by_turns.get(row["turns"])
+        if reference is None:
+            continue
+        for metric, is_timing in TRACKED_METRICS.items():
+            if metric not in reference:
+                continue
+            current, expected = row[metric], reference[metric]
+            if metric == "rss_growth_mb":
+                regressed = current > expected + memory_tolerance_mb
+            elif is_timing:
+                regressed = current > expected * (1 + tolerance)
+            else:
+                regressed = current > expected
+            if regressed:
+                regressions.append(f"{row['turns']} turns: {metric} {current} (baseline {expected})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000], help="Turns per session")
+    parser.add_argument("--seed", type=int, default=0, help="Mock provider seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Sessions per length; the median is reported")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE),
+                        help="Store the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=str(DEFAULT_BASELINE),
+                        help="Compare against a baseline and exit non-zero on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed relative slowdown for timings")
+    parser.add_argument("--memory-tolerance", type=float, default=8.0,
+                        help="Allowed extra RSS growth in MB")
+    args = parser.parse_args(argv)
+
+    results = run(args.lengths, args.seed, args.repeat)
+
+    print(f"{'turns':>6} {'start (ms)':>11} {'turn p50 (ms)':>14} {'turn p95 (ms)':>14} "
+          f"{'history (us)':>13} {'prompt tok':>11} {'rss (MB)':>9}")
+    for row in results:
+        print(f"{row['turns']:>6} {row['start_overhead_ms']:>11} {row['turn_overhead_ms_p50']:>14} "
+              f"{row['turn_overhead_ms_p95']:>14} {row['format_history_us_mean']:>13} "
+              f"{row['prompt_tokens_mean']:>11} {row['rss_growth_mb']:>9}")
+
+    report = {"benchmark": "engine_sessions", "seed": args.seed, "python": sys.version.split()[0],
+              "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
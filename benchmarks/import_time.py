@@ -0,0 +1,111 @@
+"""Benchmark: cold-start import time of the CLI and app entry points.
+
+Imports each target in a fresh interpreter with ``python -X importtime``
+and reports the median cumulative import time and the slowest modules it
+pulls in. With ``--check``, each target is compared against its budget in
+``import_budget.json``: the import must stay under ``budget_ms`` and must
+not load any of its ``forbidden`` modules (provider SDKs are only loaded
+when a session builds that provider). The forbidden lists are machine
+independent; time budgets are generous and meant to catch large
+regressions, such as an eager import of a whole SDK.
+
+Run with:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --check
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET = Path(__file__).with_name("import_budget.json")
+
+
+def measure(module: str) -> Dict[str, Tuple[int, int]]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        Module name -> (self, cumulative) import time in microseconds
+    """
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    # Bytecode is cached by the first run, so later runs measure a warm disk cache
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    timings = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(own), int(cumulative))
+    return timings
+
+
+def run_target(module: str, repeat: int) -> Dict[str, object]:
+    """Measure a target several times and keep the median run"""
+    runs = [measure(module) for _ in range(repeat)]
+    totals = [run[module][1] for run in runs]
+    median_run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    slowest = sorted(median_run.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "module": module,
+        "total_ms": round(statistics.median(totals) / 1000, 1),
+        "modules": len(median_run),
+        "slowest": [(name, round(own / 1000, 1)) for name, (own, _) in slowest[:10]],
+        "loaded": set(median_run)
+    }
+
+
+def check(result: Dict[str, object], budget: Dict[str, object]) -> List[str]:
+    """List budget violations for one target"""
+    problems = []
+    if result["total_ms"] > budget["budget_ms"]:
+        problems.append(f"{result['module']}: {result['total_ms']} ms over budget {budget['budget_ms']} ms")
+    for name in budget.get("forbidden", []):
+        if name in result["loaded"]:
+            problems.append(f"{result['module']}: imports {name} eagerly")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET), help="Budget file")
+    parser.add_argument("--targets", nargs="+", help="Modules to import (default: every budgeted target)")
+    parser.add_argument("--repeat", type=int, default=5, help="Imports per target; the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="Slowest modules to list per target")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if a target exceeds its budget")
+    args = parser.parse_args(argv)
+
+    budgets = json.loads(Path(args.budget).read_text(encoding="utf-8"))["targets"]
+    targets = args.targets or list(budgets)
+
+    problems = []
+    print(f"{'target':>22}  {'import (ms)':>11}  {'budget':>7}  {'modules':>7}")
+    for module in targets:
+        result = run_target(module, args.repeat)
+        budget = budgets.get(module)
+        print(f"{module:>22}  {result['total_ms']:>11}  {budget['budget_ms'] if budget else '-':>7}  "
+              f"{result['modules']:>7}")
+        for name, own in result["slowest"][:args.top]:
+            print(f"{'':>24}{own:>7} ms  {name}")
+        if budget:
+            problems.extend(check(result, budget))
+
+    if args.check and problems:
+        print("Import budget exceeded:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
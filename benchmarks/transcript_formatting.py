@@ -0,0 +1,83 @@
+"""Micro-benchmark: per-turn history formatting cost versus history length.
+
+Compares rebuilding the conversation string from every message on each turn
+(the old ``_format_conversation_history`` plus the extra concatenation for the
+state chain) with the incrementally maintained ``Transcript``.
+
+Run with:
+    python -m benchmarks.transcript_formatting
+"""
+import argparse
+import timeit
+from typing import List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from src.transcript import Transcript
+
+# Roughly the size of a narration from gpt-4o-mini
+NARRATION = "The mist curls between the ancient trees as you step forward. " * 12
+PLAYER_INPUT = "I follow the glowing path towards the waterfall."
+PLAYER_MESSAGE = HumanMessage(content=PLAYER_INPUT)
+NARRATOR_MESSAGE = AIMessage(content=NARRATION)
+
+
+def build_history(length: int) -> List[BaseMessage]:
+    """Build an alternating player/narrator history"""
+    return [
+        PLAYER_MESSAGE if i % 2 == 0 else NARRATOR_MESSAGE
+        for i in range(length)
+    ]
+
+
+def rebuild_turn(messages: List[BaseMessage]) -> str:
+    """Old behaviour: re-render the whole history for both chains"""
+    history = "\n".join([
+        f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
+        for msg in messages
+    ])
+    return history + "\n\n" + NARRATION
+
+
+def incremental_turn(transcript: Transcript) -> str:
+    """New behaviour: render only the new messages and read the shared text"""
+    transcript.append(PLAYER_MESSAGE)
+    transcript.drop(1)  # keep the history length constant, as trimming does
+    transcript.text  # read by the story prompt
+    transcript.append(NARRATOR_MESSAGE)
+    transcript.drop(1)
+    return transcript.text
+
+
+def run(lengths: List[int], number: int) -> List[dict]:
+    """Time one turn's formatting for each history length"""
+    results = []
+    for length in lengths:
+        messages = build_history(length)
+        transcript = Transcript(pinned=3)
+        transcript.extend(messages)
+
+        before = timeit.timeit(lambda: rebuild_turn(messages), number=number) / number
+        after = timeit.timeit(lambda: incremental_turn(transcript), number=number) / number
+        results.append({
+            "messages": length,
+            "rebuild_us": round(before * 1e6, 2),
+            "incremental_us": round(after * 1e6, 2),
+            "speedup": round(before / after, 1) if after else float("inf")
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 30, 100, 300, 1000])
+    parser.add_argument("--number", type=int, default=200, help="Turns timed per history length")
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'rebuild (us)':>14} {'incremental (us)':>18} {'speedup':>9}")
+    for row in run(args.lengths, args.number):
+        print(f"{row['messages']:>10} {row['rebuild_us']:>14} {row['incremental_us']:>18} {row['speedup']:>8}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,13 +10,11 @@ async def main():
     # Initialize configuration
     config = ChatConfig(
         provider=ChatProvider.OPENAI, # can choose between OPENAI and OPENROUTER 
-        system_prompt_path="templates/system_prompt.md",
-        max_history=10
+        system_prompt_path="templates/system_prompt.md"
     )
     
     # Initialize and run game
     game = GameEngine(config)
-    game.initialize_game()
     await game.run_game_loop()
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, ClassVar
-from langchain.schema import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from pydantic import SecretStr
 
 class BaseChatProvider(ABC):
@@ -8,10 +8,14 @@ class BaseChatProvider(ABC):
     
     SUPPORTED_MODELS: ClassVar[List[str]] = []
     
-    @abstractmethod
     async def agenerate_with_retry(self, messages: List[List[BaseMessage]], *args, **kwargs):
-        """Generate response with retry logic"""
-        pass
+        """Generate a response.
+
+        Retries, backoff and circuit breaking are applied to every call by
+        ResilientChatProvider (see ChatConfig.get_chat_provider), so this is
+        a plain ``agenerate``.
+        """
+        return await self.agenerate(messages=messages, *args, **kwargs)
     
     @classmethod
     def list_supported_models(cls) -> List[str]:
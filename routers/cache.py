@@ -0,0 +1,277 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from .provider_wrapper import ChatProviderWrapper
+
+
+def make_cache_key(model_name: Optional[str],
+                   temperature: Optional[float],
+                   messages: List[BaseMessage],
+                   stop: Optional[List[str]] = None,
+                   **params: Any) -> str:
+    """Build a cache key from the model, sampling parameters and rendered messages"""
+    payload = json.dumps({
+        "model": model_name,
+        "temperature": temperature,
+        "stop": stop,
+        "params": params,
+        "messages": [[message.type, message.content] for message in messages]
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Abstract base class for completion caches with LRU and TTL eviction"""
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        """Get a live entry and mark it as recently used"""
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, text: str) -> None:
+        """Store an entry, evicting the least recently used beyond max_entries"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Look up a cached completion, counting the hit or miss"""
+        with self._lock:
+            text = self._get(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return text
+
+    def update(self, key: str, text: str) -> None:
+        """Store a completion"""
+        with self._lock:
+            self._set(key, text)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self)
+        }
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Process-local LRU cache"""
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = None):
+        super().__init__(max_entries, ttl)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry[0]):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _set(self, key: str, text: str) -> None:
+        self._entries[key] = (time.time(), text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk LRU cache shared across processes and restarts"""
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: Optional[float] = None):
+        super().__init__(max_entries, ttl)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[1]):
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def _set(self, key: str, text: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, text, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, text, now, now)
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+_caches: Dict[tuple, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(backend: str = "memory",
+                       path: str = ".cache/responses.sqlite",
+                       max_entries: int = 1000,
+                       ttl: Optional[float] = None) -> ResponseCache:
+    """Get a process-wide cache for the given backend ("memory" or "sqlite")"""
+    key = (backend, path if backend == "sqlite" else None, max_entries, ttl)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            if backend == "memory":
+                cache = InMemoryResponseCache(max_entries, ttl)
+            elif backend == "sqlite":
+                cache = SQLiteResponseCache(path, max_entries, ttl)
+            else:
+                raise ValueError(f"Unsupported cache backend: {backend}. Supported backends: memory, sqlite")
+            _caches[key] = cache
+        return cache
+
+
+class CachedChatProvider(ChatProviderWrapper):
+    """Chat provider that serves repeated prompts from a ResponseCache"""
+
+    # Not ``cache``: that name is LangChain's own cache setting on chat models
+    response_cache: ResponseCache
+
+    def __init__(self, inner, response_cache: ResponseCache, **kwargs: Any):
+        super().__init__(inner=inner, response_cache=response_cache, **kwargs)
+
+    def _cache_key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+        return make_cache_key(self.model_name, self.temperature, messages, stop, **kwargs)
+
+    @staticmethod
+    def _cached_result(text: str) -> ChatResult:
+        # Marked so usage accounting does not charge for it
+        return ChatResult(generations=[ChatGeneration(
+            message=AIMessage(content=text, response_metadata={"cache_hit": True})
+        )])
+
+    def _store(self, key: str, result: ChatResult) -> None:
+        text = result.generations[0].text
+        if text:
+            self.response_cache.update(key, text)
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        key = self._cache_key(messages, stop, kwargs)
+        text = self.response_cache.lookup(key)
+        if text is not None:
+            return self._cached_result(text)
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._store(key, result)
+        return result
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        key = self._cache_key(messages, stop, kwargs)
+        text = self.response_cache.lookup(key)
+        if text is not None:
+            return self._cached_result(text)
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._store(key, result)
+        return result
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        key = self._cache_key(messages, stop, kwargs)
+        text = self.response_cache.lookup(key)
+        if text is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, response_metadata={"cache_hit": True}))
+            return
+        parts = []
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            parts.append(chunk.text)
+            yield chunk
+        if parts:
+            self.response_cache.update(key, "".join(parts))
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        key = self._cache_key(messages, stop, kwargs)
+        text = self.response_cache.lookup(key)
+        if text is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, response_metadata={"cache_hit": True}))
+            return
+        parts = []
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            parts.append(chunk.text)
+            yield chunk
+        if parts:
+            self.response_cache.update(key, "".join(parts))
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for the underlying cache"""
+        return self.response_cache.stats()
@@ -0,0 +1,225 @@
+from typing import Any, AsyncIterator, ClassVar, Dict, Iterator, List, Literal, Optional
+from collections import Counter
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+import asyncio
+import hashlib
+import json
+import random
+import time
+from .base_chat_provider import BaseChatProvider
+
+_PLACES = ["the Sunken Library", "Emberfall Keep", "the Whispering Marsh", "Glasswater Docks",
+           "the Hollow Oak", "Ironvale Market", "the Starlit Observatory", "Ashen Crossroads"]
+_ITEMS = ["brass compass", "silver key", "healing draught", "torn map", "lantern",
+          "rune-etched dagger", "coil of rope", "sealed letter"]
+_COMPANIONS = ["Mira the tinker", "Old Bram", "a curious fox", "Sister Ilse", "Kael the ranger"]
+_WORDS = ("the wind carries a faint song as shadows gather near ancient stones while distant bells "
+          "ring and a lantern flickers beside the path where footprints vanish into mist and "
+          "something stirs beneath the floorboards as you weigh your next move carefully").split()
+
+
+class MockProviderError(Exception):
+    """Injected failure, shaped like an HTTP error from a real provider"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Mock provider injected error (status {status_code})")
+        self.status_code = status_code
+        # Seconds a Retry-After header would ask for
+        self.retry_after = retry_after
+
+
+class ChatMock(BaseChatProvider, BaseChatModel):
+    """Offline chat provider for load tests and benchmarks.
+
+    Replies are seeded from the prompt, so the same prompt always gets the
+    same text, and are shaped after the game's prompts: option menus,
+    JSON state updates, summaries and narrations with numbered choices.
+    Latency, streaming cadence, reply length and failures are configurable,
+    so engine-level performance can be measured without network access.
+    """
+
+    SUPPORTED_MODELS: ClassVar[List[str]] = ["mock-storyteller"]
+
+    model_name: str = "mock-storyteller"
+    temperature: float = 0.7
+    seed: int = 0
+    # Delay before the first token, drawn per call
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    latency_distribution: Literal["fixed", "uniform", "lognormal"] = "fixed"
+    # Streaming cadence
+    chunk_words: int = 4
+    chunk_interval: float = 0.0
+    # Length of narrations and summaries
+    narration_words: int = 120
+    # Fraction of calls that fail, and the status code they report
+    error_rate: float = 0.0
+    error_status: int = 500
+    error_retry_after: Optional[float] = None
+    stream_usage: bool = True
+
+    # Calls seen per prompt, so a retried prompt gets a fresh failure draw
+    _attempts: Counter = PrivateAttr(default_factory=Counter)
+
+    def __init__(self, model_name: str = "mock-storyteller", **kwargs: Any):
+        self._validate_model(model_name)
+        super().__init__(model_name=model_name, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "seed": self.seed}
+
+    @property
+    def model_info(self) -> Dict[str, Any]:
+        """Get model information"""
+        return {
+            "model_name": self.model_name,
+            "seed": self.seed,
+            "latency": self.latency,
+            "latency_distribution": self.latency_distribution,
+            "error_rate": self.error_rate
+        }
+
+    @staticmethod
+    def _digest(messages: List[BaseMessage]) -> str:
+        return hashlib.sha256("\x00".join(str(m.content) for m in messages).encode("utf-8")).hexdigest()
+
+    def _rng(self, messages: List[BaseMessage]) -> random.Random:
+        """Random source seeded from the provider seed and the prompt"""
+        return random.Random(f"{self.seed}:{self._digest(messages)}")
+
+    def _delay(self, rng: random.Random) -> float:
+        """Draw the time to first token"""
+        if self.latency_distribution == "uniform":
+            delay = rng.uniform(self.latency - self.latency_jitter, self.latency + self.latency_jitter)
+        elif self.latency_distribution == "lognormal" and self.latency > 0:
+            delay = rng.lognormvariate(0.0, self.latency_jitter) * self.latency
+        else:
+            delay = self.latency
+        return max(delay, 0.0)
+
+    def _maybe_fail(self, messages: List[BaseMessage]) -> None:
+        """Fail a seeded fraction of calls; each retry of a prompt draws again"""
+        if not self.error_rate:
+            return
+        digest = self._digest(messages)
+        self._attempts[digest] += 1
+        if random.Random(f"{self.seed}:{digest}:{self._attempts[digest]}").random() < self.error_rate:
+            raise MockProviderError(self.error_status, self.error_retry_after)
+
+    def _sentence(self, rng: random.Random, words: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+    def _reply(self, messages: List[BaseMessage], rng: random.Random) -> str:
+        """Build a reply that matches the kind of prompt the game sent"""
+        prompt = str(messages[-1].content)
+        # Story prompts quote the option menu in their history, so check them first
+        if "<character_options>" in prompt and "Previous conversation:" not in prompt:
+            return "\n".join(
+                [f"{i}. Character: {name}" for i, name in enumerate(rng.sample(_COMPANIONS, 4), 1)]
+                + [f"{i}. Setting: {place}" for i, place in enumerate(rng.sample(_PLACES, 4), 5)]
+            )
+        if "Previous state:" in prompt:
+            update = {"location": rng.choice(_PLACES)}
+            if rng.random() < 0.4:
+                update["items_gained"] = [rng.choice(_ITEMS)]
+            if rng.random() < 0.2:
+                update["companions_joined"] = [rng.choice(_COMPANIONS)]
+            return "```json\n" + json.dumps(update) + "\n```"
+        if "Summary so far:" in prompt:
+            return self._sentence(rng, min(self.narration_words, 60)).capitalize() + "."
+        narration = self._sentence(rng, self.narration_words).capitalize() + "."
+        choices = "\n".join(f"{i}. Head for {place}" for i, place in enumerate(rng.sample(_PLACES, 3), 1))
+        return f"{narration}\n\n{choices}"
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], text: str) -> UsageMetadata:
+        """Approximate token usage at four characters per token"""
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4 + 4 * len(messages)
+        output_tokens = max(len(text) // 4, 1)
+        return UsageMetadata(input_tokens=input_tokens, output_tokens=output_tokens,
+                             total_tokens=input_tokens + output_tokens)
+
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        size = max(self.chunk_words, 1)
+        return [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "")
+                for i in range(0, len(words), size)]
+
+    def _result(self, messages: List[BaseMessage], text: str) -> ChatResult:
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text),
+                            response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        rng = self._rng(messages)
+        time.sleep(self._delay(rng))
+        self._maybe_fail(messages)
+        text = self._reply(messages, rng)
+        time.sleep(self.chunk_interval * (len(self._chunks(text)) - 1))
+        return self._result(messages, text)
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        rng = self._rng(messages)
+        await asyncio.sleep(self._delay(rng))
+        self._maybe_fail(messages)
+        text = self._reply(messages, rng)
+        await asyncio.sleep(self.chunk_interval * (len(self._chunks(text)) - 1))
+        return self._result(messages, text)
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        rng = self._rng(messages)
+        time.sleep(self._delay(rng))
+        self._maybe_fail(messages)
+        text = self._reply(messages, rng)
+        for i, part in enumerate(self._chunks(text)):
+            if i:
+                time.sleep(self.chunk_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=part))
+            if run_manager:
+                run_manager.on_llm_new_token(part, chunk=chunk)
+            yield chunk
+        if self.stream_usage:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, text),
+                                                             response_metadata={"model_name": self.model_name}))
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        rng = self._rng(messages)
+        await asyncio.sleep(self._delay(rng))
+        self._maybe_fail(messages)
+        text = self._reply(messages, rng)
+        for i, part in enumerate(self._chunks(text)):
+            if i:
+                await asyncio.sleep(self.chunk_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=part))
+            if run_manager:
+                await run_manager.on_llm_new_token(part, chunk=chunk)
+            yield chunk
+        if self.stream_usage:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, text),
+                                                             response_metadata={"model_name": self.model_name}))
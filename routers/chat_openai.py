@@ -2,7 +2,6 @@ from langchain_openai import ChatOpenAI
 from typing import List, Dict, Any, ClassVar
 from pydantic import SecretStr
 from .base_chat_provider import BaseChatProvider
-from langchain.schema import BaseMessage
 
 class ChatOpenAIProvider(BaseChatProvider, ChatOpenAI):
     """OpenAI-specific chat provider implementation"""
@@ -29,9 +28,6 @@ class ChatOpenAIProvider(BaseChatProvider, ChatOpenAI):
             **kwargs
         )
     
-    async def agenerate_with_retry(self, messages: List[List[BaseMessage]], *args, **kwargs):
-        return await self.agenerate(messages=messages, *args, **kwargs)
-    
     @classmethod
     def list_supported_models(cls) -> List[str]:
         return cls.SUPPORTED_MODELS
@@ -40,6 +36,6 @@ class ChatOpenAIProvider(BaseChatProvider, ChatOpenAI):
     def model_info(self) -> Dict[str, Any]:
         return {
             "model_name": self.model_name,
-            "api_base": self.client.api_base,
+            "api_base": self.openai_api_base,
             "timeout": self.request_timeout
         }
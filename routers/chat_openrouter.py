@@ -2,9 +2,8 @@ from langchain_openai import ChatOpenAI
 from typing import Optional, Any, List, Dict, ClassVar
 from pydantic import BaseModel, Field, SecretStr
 import os
-from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
-from langchain.schema import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from .base_chat_provider import BaseChatProvider
 
 logging.basicConfig(
@@ -81,19 +80,6 @@ class ChatOpenRouter(BaseChatProvider, ChatOpenAI):
                 f"Supported models: {', '.join(self.SUPPORTED_MODELS)}"
             )
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
-    async def agenerate_with_retry(self, messages: List[List[BaseMessage]], *args, **kwargs) -> Any:
-        """Async generation with retry logic and message conversion."""
-        try:
-        # Ensure messages are list of BaseMessage
-            return await super().agenerate(messages=messages, *args, **kwargs)
-        except Exception as e:
-            logging.error(f"Unexpected error: {str(e)}")
-            raise
-
     def _convert_message_to_role(self, message: BaseMessage) -> str:
         """Convert a LangChain message type to an OpenAI role."""
         if isinstance(message, SystemMessage):
@@ -0,0 +1,327 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from .base_chat_provider import BaseChatProvider
+from .provider_wrapper import ChatProviderWrapper
+from .scheduler import current_chain
+
+# Runs primary and hedged requests for the sync API
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="chat-router")
+
+
+class BackendStats:
+    """Rolling latency and error rate of one backend"""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.last_failure = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.last_failure = time.monotonic()
+
+    @property
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self.lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95)
+        }
+
+
+class ChatRouter(BaseChatProvider, BaseChatModel):
+    """Routes each call to the fastest healthy of several chat providers.
+
+    Backends are ranked by their rolling median latency; a backend whose
+    recent error rate reaches ``error_threshold`` is skipped until
+    ``cooldown`` seconds after its last failure, then probed again. A failed
+    call fails over to the next backend. With ``hedge`` enabled, a
+    duplicate request goes to the next backend when the first has not
+    answered within its own p95 latency, and the first reply wins.
+    Streaming calls fail over but are not hedged.
+    """
+
+    backends: List[BaseChatModel]
+    hedge: bool = False
+    hedge_percentile: float = 95.0
+    # Hedge delay before the primary has enough samples for a percentile
+    initial_hedge_delay: float = 2.0
+    min_hedge_delay: float = 0.25
+    min_samples: int = 5
+    window: int = 50
+    error_threshold: float = 0.5
+    cooldown: float = 30.0
+
+    _stats: List[BackendStats] = PrivateAttr(default_factory=list)
+
+    def __init__(self, backends: List[BaseChatModel], **kwargs: Any):
+        if not backends:
+            raise ValueError("ChatRouter needs at least one backend")
+        super().__init__(backends=backends, **kwargs)
+        self._stats = [BackendStats(self.window) for _ in backends]
+
+    @property
+    def _llm_type(self) -> str:
+        return "router:" + ",".join(backend._llm_type for backend in self.backends)
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"backends": [backend._identifying_params for backend in self.backends]}
+
+    @property
+    def model_name(self) -> Optional[str]:
+        """Model name of the preferred backend"""
+        return getattr(self.backends[0], "model_name", None)
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.backends[0], "temperature", None)
+
+    @property
+    def model_info(self) -> Dict[str, Any]:
+        """Get model information with per-backend latency and error rates"""
+        return {
+            "model_name": self.model_name,
+            "backends": [
+                {"model_name": getattr(backend, "model_name", None),
+                 "provider": type(backend).__name__,
+                 **stats.snapshot()}
+                for backend, stats in zip(self.backends, self._stats)
+            ]
+        }
+
+    def _healthy(self, stats: BackendStats) -> bool:
+        if stats.error_rate < self.error_threshold:
+            return True
+        return time.monotonic() - stats.last_failure >= self.cooldown
+
+    def _ranked(self) -> List[int]:
+        """Backend indexes, fastest healthy first; unhealthy ones last as a final resort"""
+        def score(index: int) -> Tuple[bool, float, int]:
+            stats = self._stats[index]
+            median = stats.percentile(50)
+            # Unmeasured backends are tried early so they get measured
+            return not self._healthy(stats), median if median is not None else 0.0, index
+        return sorted(range(len(self.backends)), key=score)
+
+    @staticmethod
+    def _chain(run_manager) -> Optional[str]:
+        metadata = getattr(run_manager, "metadata", None) or {}
+        return metadata.get("chain")
+
+    def _hedge_delay(self, index: int) -> float:
+        stats = self._stats[index]
+        if len(stats.latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(stats.percentile(self.hedge_percentile), self.min_hedge_delay)
+
+    def _call(self, index: int, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        try:
+            result = self.backends[index]._generate(messages, stop=stop, **kwargs)
+        except Exception:
+            self._stats[index].record(time.perf_counter() - started, ok=False)
+            raise
+        self._stats[index].record(time.perf_counter() - started, ok=True)
+        return result
+
+    async def _acall(self, index: int, messages: List[BaseMessage], stop: Optional[List[str]],
+                     **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        try:
+            result = await self.backends[index]._agenerate(messages, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._stats[index].record(time.perf_counter() - started, ok=False)
+            raise
+        self._stats[index].record(time.perf_counter() - started, ok=True)
+        return result
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        # Backends run without the run manager: concurrent hedges would report tokens twice
+        order = self._ranked()
+        last_error: Optional[Exception] = None
+        token = current_chain.set(self._chain(run_manager))
+        try:
+            if not self.hedge or len(order) == 1:
+                for index in order:
+                    try:
+                        return self._call(index, messages, stop, **kwargs)
+                    except Exception as e:
+                        logging.warning(f"Chat backend {index} failed: {str(e)}")
+                        last_error = e
+                raise last_error
+            return self._hedged(order, messages, stop, **kwargs)
+        finally:
+            current_chain.reset(token)
+
+    def _hedged(self, order: List[int], messages: List[BaseMessage], stop: Optional[List[str]],
+                **kwargs: Any) -> ChatResult:
+        last_error: Optional[Exception] = None
+        pending: Dict[Future, int] = {}
+        next_backend = 0
+
+        def launch() -> None:
+            nonlocal next_backend
+            index = order[next_backend]
+            next_backend += 1
+            context = contextvars.copy_context()
+            pending[_hedge_executor.submit(context.run, self._call, index, messages, stop, **kwargs)] = index
+
+        launch()
+        while pending:
+            can_hedge = self.hedge and next_backend < len(order) and len(pending) == 1
+            timeout = self._hedge_delay(next(iter(pending.values()))) if can_hedge else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logging.debug("Hedging chat request to the next backend")
+                launch()
+                continue
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    logging.warning(f"Chat backend {index} failed: {str(e)}")
+                    last_error = e
+            if not pending and next_backend < len(order):
+                launch()
+        raise last_error
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        order = self._ranked()
+        pending: Dict[asyncio.Task, int] = {}
+        last_error: Optional[Exception] = None
+        next_backend = 0
+        # Tasks copy the context, so backends see the chain when scheduling
+        token = current_chain.set(self._chain(run_manager))
+
+        def launch() -> None:
+            nonlocal next_backend
+            index = order[next_backend]
+            next_backend += 1
+            pending[asyncio.ensure_future(self._acall(index, messages, stop, **kwargs))] = index
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge and next_backend < len(order) and len(pending) == 1
+                timeout = self._hedge_delay(next(iter(pending.values()))) if can_hedge else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.debug("Hedging chat request to the next backend")
+                    launch()
+                    continue
+                for task in done:
+                    index = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        logging.warning(f"Chat backend {index} failed: {str(e)}")
+                        last_error = e
+                if not pending and next_backend < len(order):
+                    launch()
+            raise last_error
+        finally:
+            # The losing request is no longer needed
+            for task in pending:
+                task.cancel()
+            current_chain.reset(token)
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        last_error: Optional[Exception] = None
+        for index in self._ranked():
+            backend = self.backends[index]
+            started = time.perf_counter()
+            first = True
+            try:
+                if type(backend)._stream is BaseChatModel._stream:
+                    result = backend._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                    chunks = iter([ChatProviderWrapper._result_to_chunk(result)])
+                else:
+                    chunks = backend._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+                for chunk in chunks:
+                    first = False
+                    yield chunk
+            except Exception as e:
+                self._stats[index].record(time.perf_counter() - started, ok=False)
+                if not first:
+                    # Part of the reply was already delivered
+                    raise
+                logging.warning(f"Chat backend {index} failed: {str(e)}")
+                last_error = e
+                continue
+            self._stats[index].record(time.perf_counter() - started, ok=True)
+            return
+        raise last_error
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        last_error: Optional[Exception] = None
+        for index in self._ranked():
+            backend = self.backends[index]
+            started = time.perf_counter()
+            first = True
+            try:
+                if type(backend)._astream is BaseChatModel._astream and type(backend)._stream is BaseChatModel._stream:
+                    result = await backend._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                    chunk = ChatProviderWrapper._result_to_chunk(result)
+                    first = False
+                    yield chunk
+                else:
+                    async for chunk in backend._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        first = False
+                        yield chunk
+            except Exception as e:
+                self._stats[index].record(time.perf_counter() - started, ok=False)
+                if not first:
+                    raise
+                logging.warning(f"Chat backend {index} failed: {str(e)}")
+                last_error = e
+                continue
+            self._stats[index].record(time.perf_counter() - started, ok=True)
+            return
+        raise last_error
@@ -0,0 +1,100 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import atexit
+import logging
+import threading
+import weakref
+import httpx
+
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+class _PerLoopAsyncTransport(httpx.AsyncBaseTransport):
+    """Async transport that keeps a separate connection pool per event loop.
+
+    Pooled async connections belong to the loop that opened them, so one
+    shared pool would break as soon as a second ``asyncio.run`` (or another
+    thread's loop) reused it. Each loop gets its own pool with the same limits.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = httpx.AsyncHTTPTransport(limits=self.limits)
+                self._transports[loop] = transport
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Close the pool belonging to the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+
+_clients: Dict[tuple, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_clients(base_url: Optional[str] = None,
+                     max_connections: int = 100,
+                     max_keepalive_connections: int = 20,
+                     keepalive_expiry: float = 30.0,
+                     timeout: float = 60.0) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Get the process-wide sync and async HTTP clients for an API endpoint.
+
+    Every chat provider talking to the same base URL shares these clients, so
+    new games reuse warm keep-alive connections instead of opening fresh
+    TCP/TLS sessions, and ``max_connections`` bounds concurrent requests.
+
+    Args:
+        base_url: API base URL (defaults to OpenAI's)
+        max_connections: Upper bound on open connections per client
+        max_keepalive_connections: Idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection is kept open
+        timeout: Default per-request timeout in seconds
+
+    Returns:
+        The shared (sync, async) clients
+    """
+    base_url = (base_url or DEFAULT_OPENAI_BASE_URL).rstrip("/")
+    key = (base_url, max_connections, max_keepalive_connections, keepalive_expiry, timeout)
+    with _clients_lock:
+        clients = _clients.get(key)
+        if clients is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            )
+            clients = (
+                httpx.Client(limits=limits, timeout=timeout, follow_redirects=True),
+                httpx.AsyncClient(transport=_PerLoopAsyncTransport(limits), timeout=timeout, follow_redirects=True)
+            )
+            _clients[key] = clients
+            logging.debug(f"Created HTTP connection pool for {base_url}")
+        return clients
+
+
+def close_http_clients() -> None:
+    """Close the pooled sync connections (async pools close with their loops)"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for sync_client, _ in clients:
+        sync_client.close()
+
+
+atexit.register(close_http_clients)
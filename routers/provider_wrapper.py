@@ -0,0 +1,98 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from .base_chat_provider import BaseChatProvider
+
+
+class ChatProviderWrapper(BaseChatProvider, BaseChatModel):
+    """Base class for providers that add behaviour around another chat provider.
+
+    Calls are delegated to the wrapped provider's ``_generate``/``_stream``
+    methods, so only the outermost provider reports the run to callbacks and
+    wrappers can be stacked in any order.
+    """
+
+    inner: BaseChatModel
+
+    def __init__(self, inner: BaseChatModel, **kwargs: Any):
+        super().__init__(inner=inner, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{type(self).__name__}:{self.inner._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.inner._identifying_params
+
+    @property
+    def model_name(self) -> Optional[str]:
+        """Model name of the wrapped provider"""
+        return getattr(self.inner, "model_name", None)
+
+    @property
+    def temperature(self) -> Optional[float]:
+        """Sampling temperature of the wrapped provider"""
+        return getattr(self.inner, "temperature", None)
+
+    @property
+    def model_info(self) -> Dict[str, Any]:
+        """Get model information"""
+        return {
+            "model_name": self.model_name,
+            "provider": type(self.inner).__name__,
+            "wrapper": type(self).__name__
+        }
+
+    def _inner_streams(self) -> bool:
+        """Whether the wrapped provider implements streaming"""
+        return type(self.inner)._stream is not BaseChatModel._stream
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        return self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        return await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if not self._inner_streams():
+            result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            yield self._result_to_chunk(result)
+            return
+        yield from self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if not self._inner_streams() and type(self.inner)._astream is BaseChatModel._astream:
+            result = await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            yield self._result_to_chunk(result)
+            return
+        async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield chunk
+
+    @staticmethod
+    def _result_to_chunk(result: ChatResult) -> ChatGenerationChunk:
+        """Convert a complete result into a single stream chunk"""
+        message = result.generations[0].message
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content=message.content,
+            usage_metadata=getattr(message, "usage_metadata", None),
+            response_metadata=message.response_metadata
+        ))
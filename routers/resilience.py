@@ -0,0 +1,405 @@
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from .provider_wrapper import ChatProviderWrapper
+from .scheduler import RateLimitExceeded, current_chain
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """The endpoint's circuit breaker is open; the call was not attempted"""
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """HTTP status carried by a provider error, if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient: a retryable status, a timeout or a dropped connection"""
+    if isinstance(error, (CircuitOpenError, RateLimitExceeded)):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    # Errors from an SDK can only occur once it is loaded, so neither is imported here
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    status = status_code_of(error)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After(-ms) headers"""
+    explicit = getattr(error, "retry_after", None)
+    if explicit is not None:
+        return float(explicit)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent requests.
+
+    Every request deposits ``ratio`` tokens and every retry spends one, so
+    during an outage retries add at most ``ratio`` extra load instead of
+    multiplying it by the number of attempts. ``min_tokens`` allows a few
+    retries when traffic is low.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_tokens = min_tokens
+        self.tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            # Cap the balance so a quiet spell cannot bank an unlimited burst
+            self.tokens = min(self.tokens + self.ratio, max(self.min_tokens, 100 * self.ratio))
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Fails fast while an endpoint is down.
+
+    Opens after ``failure_threshold`` consecutive transient failures. While
+    open, calls raise CircuitOpenError without reaching the endpoint; after
+    ``reset_timeout`` seconds one probe call is let through (half-open) and
+    its outcome closes or reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """Give back a probe slot taken by a call that never reached the endpoint"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """Count a transient failure; returns True if it opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                opened = self.state != self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+                return opened
+            return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class Endpoint:
+    """Breaker and retry budget shared by every provider calling one endpoint"""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, budget: RetryBudget):
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+
+
+_endpoints: Dict[tuple, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(name: str,
+                 account: Optional[str] = None,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 retry_budget_ratio: float = 0.2) -> Endpoint:
+    """Get the process-wide breaker and retry budget for an endpoint.
+
+    Args:
+        name: Endpoint name, e.g. provider and model; used in logs and metrics
+        account: Fingerprint of the credentials used; each account gets its own
+            breaker and budget, since quota errors on one key say nothing about another
+    """
+    key = (name, account, failure_threshold, reset_timeout, retry_budget_ratio)
+    with _endpoints_lock:
+        endpoint = _endpoints.get(key)
+        if endpoint is None:
+            endpoint = Endpoint(name, CircuitBreaker(failure_threshold, reset_timeout),
+                                RetryBudget(retry_budget_ratio))
+            _endpoints[key] = endpoint
+        return endpoint
+
+
+class ResilientChatProvider(ChatProviderWrapper):
+    """Chat provider that retries transient failures behind a circuit breaker.
+
+    Retries use full-jitter exponential backoff, wait at least as long as
+    a Retry-After header asks, and are drawn from the endpoint's retry
+    budget. A Retry-After longer than ``max_retry_after`` is not waited
+    out; the error is raised so a router can fail over. Streaming calls
+    are only retried before the first chunk.
+    """
+
+    endpoint: Endpoint
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    max_retry_after: float = 60.0
+    metrics: Any = None
+
+    def __init__(self, inner, endpoint: Endpoint, **kwargs: Any):
+        super().__init__(inner=inner, endpoint=endpoint, **kwargs)
+
+    @property
+    def model_info(self) -> Dict[str, Any]:
+        """Get model information with the endpoint's circuit state"""
+        return {**self.inner.model_info, "circuit": self.endpoint.breaker.snapshot()}
+
+    @staticmethod
+    def _chain(run_manager) -> str:
+        metadata = getattr(run_manager, "metadata", None) or {}
+        return metadata.get("chain") or current_chain.get() or "unknown"
+
+    def _admit(self) -> None:
+        if not self.endpoint.breaker.allow():
+            raise CircuitOpenError(f"{self.endpoint.name} is failing; circuit open")
+        self.endpoint.budget.deposit()
+
+    def _record_error(self, error: BaseException) -> bool:
+        """Resolve the breaker for a failed call; returns True if a retry may help"""
+        if isinstance(error, RateLimitExceeded):
+            # Our own limiter gave up; the endpoint was never called
+            self.endpoint.breaker.release()
+            return False
+        if not is_retryable(error):
+            # The endpoint answered, it just rejected this request
+            self.endpoint.breaker.record_success()
+            return False
+        if self.endpoint.breaker.record_failure():
+            logging.error(f"Circuit opened for {self.endpoint.name} after repeated failures")
+            if self.metrics is not None:
+                self.metrics.increment("game_circuit_open_total", endpoint=self.endpoint.name)
+            # Retrying now would only hit the open circuit
+            return False
+        return True
+
+    def _backoff(self, attempt: int, error: BaseException, chain: str) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up"""
+        if not self._record_error(error):
+            return None
+        if attempt >= self.max_attempts:
+            return None
+        requested = retry_after(error)
+        if requested is not None and requested > self.max_retry_after:
+            return None
+        if not self.endpoint.budget.withdraw():
+            logging.warning(f"Retry budget for {self.endpoint.name} exhausted")
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if requested is not None:
+            delay = max(delay, requested)
+        logging.warning(f"Retrying {chain} call to {self.endpoint.name} in {delay:.2f}s: {str(error)}")
+        if self.metrics is not None:
+            self.metrics.increment("game_llm_retries_total", chain=chain)
+        return delay
+
+    def _succeeded(self) -> None:
+        self.endpoint.breaker.record_success()
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        chain = self._chain(run_manager)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit()
+            resolved = False
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                resolved = True
+                delay = self._backoff(attempt, e, chain)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            else:
+                resolved = True
+                self._succeeded()
+                return result
+            finally:
+                if not resolved:
+                    # The call was cancelled (e.g. a losing hedge); free a half-open probe slot
+                    self.endpoint.breaker.release()
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        chain = self._chain(run_manager)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit()
+            resolved = False
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                resolved = True
+                delay = self._backoff(attempt, e, chain)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            else:
+                resolved = True
+                self._succeeded()
+                return result
+            finally:
+                if not resolved:
+                    # The call was cancelled (e.g. a losing hedge); free a half-open probe slot
+                    self.endpoint.breaker.release()
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        chain = self._chain(run_manager)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit()
+            started = False
+            resolved = False
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    yield chunk
+                resolved = True
+            except Exception as e:
+                resolved = True
+                if started:
+                    # Chunks already reached the caller, so the call cannot be retried
+                    self._record_error(e)
+                    raise
+                delay = self._backoff(attempt, e, chain)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            finally:
+                if not resolved:
+                    # The caller abandoned the stream; free a half-open probe slot
+                    self.endpoint.breaker.release()
+            self._succeeded()
+            return
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        chain = self._chain(run_manager)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit()
+            started = False
+            resolved = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    yield chunk
+                resolved = True
+            except Exception as e:
+                resolved = True
+                if started:
+                    # Chunks already reached the caller, so the call cannot be retried
+                    self._record_error(e)
+                    raise
+                delay = self._backoff(attempt, e, chain)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                if not resolved:
+                    # The caller abandoned the stream; free a half-open probe slot
+                    self.endpoint.breaker.release()
+            self._succeeded()
+            return
@@ -0,0 +1,361 @@
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from .provider_wrapper import ChatProviderWrapper
+
+# Lower runs first: the player is waiting on story turns, the rest is background work
+CHAIN_PRIORITIES = {
+    "story": 0,
+    "character": 1,
+    # Background refills of the option menu pool
+    "option_pool": 2,
+    "summary": 2,
+    "state": 2,
+}
+DEFAULT_PRIORITY = 1
+
+# Output tokens reserved for a call that does not set max_tokens
+DEFAULT_OUTPUT_RESERVE = 256
+
+# Chain of the current call, for wrappers (like ChatRouter) that call
+# providers without passing the run manager along
+current_chain: ContextVar[Optional[str]] = ContextVar("current_chain", default=None)
+
+
+class RateLimitExceeded(Exception):
+    """A request waited longer than the scheduler's ``max_wait`` for its turn"""
+
+
+class TokenBucket:
+    """Budget of ``per_minute`` units refilled continuously"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available"""
+        self._refill(now)
+        # A request larger than the whole budget only waits for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def credit(self, amount: float) -> None:
+        """Return (or, if negative, charge) units after the real cost is known"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RequestScheduler:
+    """Admits provider calls within requests- and tokens-per-minute budgets.
+
+    Calls wait in a priority queue and are admitted in priority order (FIFO
+    within a priority) as the token buckets refill. A call's token cost is
+    reserved up front from its prompt size and output limit, then corrected
+    with the usage the provider reports. Calls with a priority above
+    ``interactive_priority`` give up with RateLimitExceeded after
+    ``max_wait`` seconds; interactive calls always wait.
+    """
+
+    def __init__(self,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_wait: Optional[float] = 30.0,
+                 interactive_priority: int = 0,
+                 name: str = "provider",
+                 metrics=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_wait = max_wait
+        self.interactive_priority = interactive_priority
+        self.name = name
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        # Heap of (priority, sequence) for calls waiting to be admitted
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._admitted = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+
+    def _enqueue(self, priority: int) -> Tuple[int, int]:
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _admit_delay(self, ticket: Tuple[int, int], tokens: float) -> Optional[float]:
+        """Admit the ticket if it is first in line and the budget allows.
+
+        Returns 0 once admitted, the seconds until the budget allows it if
+        it is first in line, or None while other calls are ahead of it.
+        Must be called with the lock held.
+        """
+        if self._waiting[0] != ticket:
+            return None
+        now = time.monotonic()
+        delay = max(self.requests.delay(1, now) if self.requests else 0.0,
+                    self.tokens.delay(tokens, now) if self.tokens else 0.0)
+        if delay > 0:
+            return delay
+        heapq.heappop(self._waiting)
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        # The next call in line may be admissible now
+        self._cond.notify_all()
+        return 0.0
+
+    def _give_up(self, ticket: Tuple[int, int], waited: float) -> RateLimitExceeded:
+        """Drop a ticket that waited too long; must be called with the lock held"""
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._rejected += 1
+        self._cond.notify_all()
+        return RateLimitExceeded(f"{self.name}: waited {waited:.1f}s for the rate limit")
+
+    def _deadline(self, priority: int, started: float) -> Optional[float]:
+        if self.max_wait is None or priority <= self.interactive_priority:
+            return None
+        return started + self.max_wait
+
+    def _record(self, priority: int, chain: str, waited: float, admitted: bool) -> None:
+        with self._cond:
+            if admitted:
+                self._admitted += 1
+                self._wait_total += waited
+        if self.metrics is None:
+            return
+        if admitted:
+            self.metrics.observe("game_queue_seconds", waited, queue=f"{self.name}_rate_limit", chain=chain)
+        else:
+            self.metrics.increment("game_rate_limited_total", provider=self.name, chain=chain)
+
+    def acquire(self, tokens: float, priority: int = DEFAULT_PRIORITY, chain: str = "unknown") -> float:
+        """Block until the call is admitted.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.requests is None and self.tokens is None:
+            return 0.0
+        ticket = self._enqueue(priority)
+        started = time.monotonic()
+        deadline = self._deadline(priority, started)
+        error: Optional[RateLimitExceeded] = None
+        with self._cond:
+            while True:
+                delay = self._admit_delay(ticket, tokens)
+                if delay == 0:
+                    break
+                now = time.monotonic()
+                if deadline is not None:
+                    if now >= deadline:
+                        error = self._give_up(ticket, now - started)
+                        break
+                    delay = min(delay, deadline - now) if delay is not None else deadline - now
+                # Calls behind others sleep until the queue moves
+                self._cond.wait(delay)
+        waited = time.monotonic() - started
+        self._record(priority, chain, waited, admitted=error is None)
+        if error is not None:
+            raise error
+        return waited
+
+    async def aacquire(self, tokens: float, priority: int = DEFAULT_PRIORITY, chain: str = "unknown") -> float:
+        """Wait without blocking the event loop until the call is admitted"""
+        if self.requests is None and self.tokens is None:
+            return 0.0
+        ticket = self._enqueue(priority)
+        started = time.monotonic()
+        deadline = self._deadline(priority, started)
+        error: Optional[RateLimitExceeded] = None
+        try:
+            while True:
+                with self._cond:
+                    delay = self._admit_delay(ticket, tokens)
+                    if delay == 0:
+                        break
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        error = self._give_up(ticket, now - started)
+                        break
+                # Condition waits would block the loop, so calls behind others poll
+                sleep = delay if delay is not None else 0.01
+                if deadline is not None:
+                    sleep = min(sleep, deadline - now)
+                await asyncio.sleep(sleep)
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+            raise
+        waited = time.monotonic() - started
+        self._record(priority, chain, waited, admitted=error is None)
+        if error is not None:
+            raise error
+        return waited
+
+    def reconcile(self, reserved: float, actual: Optional[float]) -> None:
+        """Correct the token budget once the provider reports real usage"""
+        if self.tokens is None or actual is None:
+            return
+        with self._cond:
+            self.tokens.credit(reserved - actual)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, wait times and remaining budgets"""
+        with self._cond:
+            now = time.monotonic()
+            by_priority: Dict[int, int] = {}
+            for priority, _ in self._waiting:
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+            if self.requests:
+                self.requests._refill(now)
+            if self.tokens:
+                self.tokens._refill(now)
+            return {
+                "queued": len(self._waiting),
+                "queued_by_priority": dict(sorted(by_priority.items())),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "mean_wait": round(self._wait_total / self._admitted, 6) if self._admitted else 0.0,
+                "requests_available": round(self.requests.level, 2) if self.requests else None,
+                "tokens_available": round(self.tokens.level, 2) if self.tokens else None
+            }
+
+
+_schedulers: Dict[tuple, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_request_scheduler(name: str,
+                          key: str,
+                          requests_per_minute: Optional[float] = None,
+                          tokens_per_minute: Optional[float] = None,
+                          max_wait: Optional[float] = 30.0,
+                          metrics=None) -> RequestScheduler:
+    """Get the process-wide scheduler for a provider account.
+
+    Every provider instance using the same key and limits shares one
+    scheduler, so the budget holds across sessions and chains.
+    """
+    registry_key = (name, key, requests_per_minute, tokens_per_minute, max_wait)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(registry_key)
+        if scheduler is None:
+            scheduler = RequestScheduler(
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                max_wait=max_wait,
+                name=name,
+                metrics=metrics
+            )
+            _schedulers[registry_key] = scheduler
+        return scheduler
+
+
+class ScheduledChatProvider(ChatProviderWrapper):
+    """Chat provider whose calls pass through a RequestScheduler.
+
+    The priority comes from the chain named in the run metadata
+    (``{"chain": "story"}``), see CHAIN_PRIORITIES.
+    """
+
+    scheduler: RequestScheduler
+
+    def __init__(self, inner, scheduler: RequestScheduler, **kwargs: Any):
+        super().__init__(inner=inner, scheduler=scheduler, **kwargs)
+
+    @property
+    def model_info(self) -> Dict[str, Any]:
+        """Get model information with the scheduler's queue state"""
+        return {**super().model_info, "scheduler": self.scheduler.stats()}
+
+    @staticmethod
+    def _chain(run_manager) -> str:
+        metadata = getattr(run_manager, "metadata", None) or {}
+        return metadata.get("chain") or current_chain.get() or "unknown"
+
+    def _reserve(self, messages: List[BaseMessage]) -> int:
+        """Estimate a call's tokens: ~4 characters per prompt token plus the output limit"""
+        prompt_chars = sum(len(message.content) if isinstance(message.content, str) else len(str(message.content))
+                           for message in messages)
+        max_tokens = getattr(self.inner, "max_tokens", None)
+        return prompt_chars // 4 + (max_tokens or DEFAULT_OUTPUT_RESERVE)
+
+    @staticmethod
+    def _usage(message) -> Optional[int]:
+        usage = getattr(message, "usage_metadata", None)
+        return usage.get("total_tokens") if usage else None
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        chain = self._chain(run_manager)
+        reserved = self._reserve(messages)
+        self.scheduler.acquire(reserved, CHAIN_PRIORITIES.get(chain, DEFAULT_PRIORITY), chain)
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.scheduler.reconcile(reserved, self._usage(result.generations[0].message))
+        return result
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        chain = self._chain(run_manager)
+        reserved = self._reserve(messages)
+        await self.scheduler.aacquire(reserved, CHAIN_PRIORITIES.get(chain, DEFAULT_PRIORITY), chain)
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.scheduler.reconcile(reserved, self._usage(result.generations[0].message))
+        return result
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        chain = self._chain(run_manager)
+        reserved = self._reserve(messages)
+        self.scheduler.acquire(reserved, CHAIN_PRIORITIES.get(chain, DEFAULT_PRIORITY), chain)
+        used = None
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            used = self._usage(chunk.message) or used
+            yield chunk
+        self.scheduler.reconcile(reserved, used)
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        chain = self._chain(run_manager)
+        reserved = self._reserve(messages)
+        await self.scheduler.aacquire(reserved, CHAIN_PRIORITIES.get(chain, DEFAULT_PRIORITY), chain)
+        used = None
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            used = self._usage(chunk.message) or used
+            yield chunk
+        self.scheduler.reconcile(reserved, used)
@@ -0,0 +1,177 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+import threading
+from .context import TokenCounter
+
+
+class TokenLedger:
+    """Token and cost totals for one game session, per chain and per turn.
+
+    Prices are per 1K tokens, as returned by ``ChatConfig.get_token_costs``.
+    Each call is priced when it is recorded, at the price of the model that
+    served it (a fallback provider's model may cost more or less than the
+    primary's), so totals stay right when calls are routed between models.
+    """
+
+    def __init__(self,
+                 prices: Dict[str, float],
+                 price_for: Optional[Callable[[str], Dict[str, float]]] = None):
+        """
+        Args:
+            prices: Price of the primary model, used when a call does not name its model
+            price_for: Looks up the price of a model by name
+        """
+        self.prices = prices
+        self.price_for = price_for
+        self._lock = threading.Lock()
+        # (chain, turn) -> [input tokens, output tokens, calls, estimated calls, cached calls, cost]
+        self._entries: Dict[Tuple[str, int], List[float]] = {}
+        # turn -> entries for that turn, so one turn is summed without a full scan
+        self._turns: Dict[int, List[List[float]]] = {}
+
+    def cost(self, input_tokens: int, output_tokens: int, model: Optional[str] = None) -> float:
+        """Price a number of input and output tokens, for ``model`` if given"""
+        prices = self.price_for(model) if model and self.price_for is not None else self.prices
+        return (input_tokens / 1000) * prices["input"] + (output_tokens / 1000) * prices["output"]
+
+    def record(self,
+               chain: str,
+               turn: int,
+               input_tokens: int,
+               output_tokens: int,
+               estimated: bool = False,
+               cached: bool = False,
+               model: Optional[str] = None) -> None:
+        """Add one call's usage; ``model`` is the model that served it"""
+        cost = self.cost(input_tokens, output_tokens, model)
+        with self._lock:
+            entry = self._entries.get((chain, turn))
+            if entry is None:
+                entry = self._entries[(chain, turn)] = [0, 0, 0, 0, 0, 0.0]
+                self._turns.setdefault(turn, []).append(entry)
+            entry[0] += input_tokens
+            entry[1] += output_tokens
+            entry[2] += 1
+            entry[3] += int(estimated)
+            entry[4] += int(cached)
+            entry[5] += cost
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._turns.clear()
+
+    def _summarize(self, entries: List[List[float]]) -> Dict[str, Any]:
+        input_tokens = sum(entry[0] for entry in entries)
+        output_tokens = sum(entry[1] for entry in entries)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "estimated_cost": round(sum(entry[5] for entry in entries), 6),
+            "calls": sum(entry[2] for entry in entries),
+            "estimated_calls": sum(entry[3] for entry in entries),
+            "cached_calls": sum(entry[4] for entry in entries)
+        }
+
+    def _group(self, index: int) -> Dict[Any, Dict[str, Any]]:
+        with self._lock:
+            groups: Dict[Any, List[List[float]]] = {}
+            for key, entry in self._entries.items():
+                groups.setdefault(key[index], []).append(list(entry))
+        return {name: self._summarize(entries) for name, entries in sorted(groups.items())}
+
+    def totals(self) -> Dict[str, Any]:
+        """Session totals"""
+        with self._lock:
+            entries = [list(entry) for entry in self._entries.values()]
+        return self._summarize(entries)
+
+    def by_chain(self) -> Dict[str, Dict[str, Any]]:
+        """Totals per chain (story, state, summary, character)"""
+        return self._group(0)
+
+    def for_turn(self, turn: int) -> Dict[str, Any]:
+        """Totals for one turn"""
+        with self._lock:
+            entries = [list(entry) for entry in self._turns.get(turn, [])]
+        return self._summarize(entries)
+
+    def by_turn(self) -> Dict[int, Dict[str, Any]]:
+        """Totals per turn; turn 0 is the option menu and turn 1 the opening scene"""
+        return self._group(1)
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Feeds a TokenLedger from any provider's responses.
+
+    Usage is read from the response message's ``usage_metadata`` or the
+    OpenAI-style ``token_usage`` in ``llm_output``. When the provider reports
+    neither, tokens are counted locally from the prompt and the reply and
+    the call is marked as estimated. Replies served from the response cache
+    cost nothing and are counted separately. The chain and turn come from
+    the run metadata (``{"chain": "story", "turn": 3}``).
+    """
+
+    run_inline = True
+
+    def __init__(self, ledger: TokenLedger, counter: TokenCounter, metrics=None):
+        self.ledger = ledger
+        self.counter = counter
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        # run_id -> (chain, turn, prompt messages)
+        self._runs: Dict[UUID, Tuple[str, int, List[BaseMessage]]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        with self._lock:
+            self._runs[run_id] = (metadata.get("chain", "unknown"), metadata.get("turn", 0), messages[0])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    @staticmethod
+    def _reported_usage(response: LLMResult) -> Optional[Tuple[int, int]]:
+        """Usage reported by the provider, if any"""
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        token_usage = (response.llm_output or {}).get("token_usage")
+        if token_usage:
+            return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+        return None
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        chain, turn, messages = run
+
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        if message is not None and message.response_metadata.get("cache_hit"):
+            self.ledger.record(chain, turn, 0, 0, cached=True)
+            return
+
+        usage = self._reported_usage(response)
+        estimated = usage is None
+        if estimated:
+            usage = (self.counter.count_messages(messages),
+                     self.counter.count(generation.text) if generation is not None else 0)
+        # The model that answered, which differs from the primary's when a router failed over
+        model = (message.response_metadata.get("model_name") if message is not None else None) \
+            or (response.llm_output or {}).get("model_name")
+        self.ledger.record(chain, turn, usage[0], usage[1], estimated=estimated, model=model)
+
+        if self.metrics is not None:
+            self.metrics.increment("game_tokens_total", usage[0], chain=chain, direction="input")
+            self.metrics.increment("game_tokens_total", usage[1], chain=chain, direction="output")
+            self.metrics.increment("game_cost_dollars_total", self.ledger.cost(*usage, model), chain=chain)
@@ -0,0 +1,49 @@
+from typing import Optional
+import logging
+import os
+import streamlit as st
+from utils.utils import load_environment_variables
+from .config import ChatConfig, ChatProvider
+from .session_manager import SessionManager, get_session_manager
+
+# Streamlit re-executes app.py on every interaction, so anything built there
+# is rebuilt per rerun. The resources below are built once per server process
+# and shared by every player; they live in this module rather than in app.py
+# so that the cached functions are only defined (and keyed) once.
+
+
+@st.cache_resource(show_spinner=False)
+def configure_process() -> None:
+    """Load environment variables and configure logging"""
+    load_environment_variables()
+
+    # Configure logging to write to a file
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('game_debug.log'),
+            logging.StreamHandler()  # This will also show logs in terminal
+        ]
+    )
+    logging.debug("Streamlit app started")
+
+
+@st.cache_resource(show_spinner=False)
+def get_manager() -> SessionManager:
+    """The session manager, which shares provider clients, compiled chains,
+    templates and tokenizers between players"""
+    return get_session_manager()
+
+
+# Configs hold a player's API key, so only the most recently used ones are kept
+@st.cache_resource(show_spinner=False, max_entries=64)
+def get_config(use_free_version: bool, api_key: Optional[str]) -> ChatConfig:
+    """Chat configuration shared by every player with the same settings"""
+    return ChatConfig(
+        provider=ChatProvider.LLAMA if use_free_version else ChatProvider.OPENAI,
+        api_key=None if use_free_version else api_key,
+        base_url=os.getenv('PARASAIL_BASE_URL') if use_free_version else None,
+        # Journaled sessions can be resumed after they expire or the server restarts
+        journal_dir=os.getenv('GAME_JOURNAL_DIR')
+    )
@@ -0,0 +1,152 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Optional
+from langchain_core.runnables import Runnable
+import logging
+import threading
+import time
+from .metrics import get_metrics_registry
+
+
+class _Job:
+    __slots__ = ("inputs", "config", "callback", "future", "submitted")
+
+    def __init__(self, inputs: dict, config: Optional[dict], callback: Optional[Callable[[Any], Any]]):
+        self.inputs = inputs
+        self.config = config or {}
+        self.callback = callback
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects calls to a runnable from many sessions and runs them in batches.
+
+    A batch is sent when ``max_batch_size`` jobs are waiting or the oldest
+    job has waited ``max_wait`` seconds. Batches go out through
+    ``Runnable.batch`` without waiting for earlier batches to finish; a
+    semaphore bounds the calls in flight across all batches to
+    ``max_concurrency``. Each job's result is passed to its callback on a
+    dispatch thread and the callback's return value resolves its future.
+    """
+
+    def __init__(self,
+                 runnable: Runnable,
+                 max_batch_size: int = 8,
+                 max_wait: float = 0.025,
+                 max_concurrency: int = 32,
+                 name: str = "state"):
+        self.runnable = runnable
+        # A batch holds one slot per job, so it can never need more than exist
+        self.max_batch_size = max(1, min(max_batch_size, max_concurrency))
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.name = name
+        self.metrics = get_metrics_registry()
+        self._queue: Deque[_Job] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        # One slot per call in flight
+        self._slots = threading.Semaphore(max_concurrency)
+        self._dispatch = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix=f"{name}-batch")
+
+    def submit(self,
+               inputs: dict,
+               config: Optional[dict] = None,
+               callback: Optional[Callable[[Any], Any]] = None) -> Future:
+        """Queue a call.
+
+        Args:
+            inputs: Inputs for the runnable
+            config: Runnable config for this call (callbacks, metadata)
+            callback: Receives the result; its return value resolves the future
+
+        Returns:
+            A future for the callback's return value (or the result)
+        """
+        job = _Job(inputs, config, callback)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} batcher is closed")
+            self._queue.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job.future
+
+    def _next_batch(self) -> List[_Job]:
+        """Wait for a full batch or for the oldest job's deadline"""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            deadline = self._queue[0].submitted + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            # Waits only while max_concurrency calls are in flight; jobs
+            # queued meanwhile go out together in the next batch
+            for _ in batch:
+                self._slots.acquire()
+            self._dispatch.submit(self._execute, batch)
+
+    def _execute(self, batch: List[_Job]) -> None:
+        try:
+            self._call(batch)
+        finally:
+            for _ in batch:
+                self._slots.release()
+
+    def _call(self, batch: List[_Job]) -> None:
+        started = time.monotonic()
+        for job in batch:
+            self.metrics.observe("game_queue_seconds", started - job.submitted, queue=f"{self.name}_batch")
+        self.metrics.increment("game_batches_total", batcher=self.name)
+        self.metrics.increment("game_batched_jobs_total", len(batch), batcher=self.name)
+
+        configs = [{**job.config, "max_concurrency": len(batch)} for job in batch]
+        try:
+            with self.metrics.span("batch", batcher=self.name):
+                results = self.runnable.batch([job.inputs for job in batch], config=configs,
+                                              return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for job, result in zip(batch, results):
+            if isinstance(result, Exception):
+                job.future.set_exception(result)
+                continue
+            try:
+                value = job.callback(result) if job.callback is not None else result
+            except Exception as e:
+                logging.error(f"Error handling {self.name} batch result: {str(e)}")
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(value)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def close(self) -> None:
+        """Run the jobs still queued and stop the batcher threads"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self._dispatch.shutdown(wait=True)
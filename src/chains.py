@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+from .config import ChatConfig
+from .templates import get_template_registry
+from .option_pool import OptionPool, get_option_pool, release_option_pool
+from .game_state import GameStateUpdate
+from .metrics import get_metrics_registry
+from .batching import MicroBatcher
+from routers.cache import CachedChatProvider
+
+CHARACTER_SETUP_PATH = "templates/character_setting_setup.md"
+SUMMARY_PROMPT_PATH = "templates/story_summary.md"
+STATE_PROMPT_PATH = "templates/state_extract.md"
+
+STORY_TEMPLATE = "Previous conversation:\n{history}\n\nCurrent state:\n{state_message}\n\nCurrent input:\n{user_input}"
+SUMMARY_SECTION = "Story so far:\n{summary}\n\n"
+
+
+class ChainSet:
+    """Provider, prompts and chains shared by every game using the same configuration.
+
+    Chains are stateless, so one ChainSet can serve any number of sessions;
+    only the conversation and game state live on each GameEngine. Background
+    work (state extraction, summaries) for all of those sessions runs on the
+    ChainSet's executor.
+    """
+
+    def __init__(self, config: ChatConfig):
+        self.config = config
+        self.storyteller = config.get_chat_provider()
+        self.templates = get_template_registry()
+
+        # Completion cache for the chains that opt in (config.cached_chains)
+        self.response_cache = config.get_response_cache()
+        self.cached_storyteller = (
+            CachedChatProvider(self.storyteller, self.response_cache)
+            if self.response_cache is not None else None
+        )
+
+        self.state_parser = PydanticOutputParser(pydantic_object=GameStateUpdate)
+        self.executor = ThreadPoolExecutor(max_workers=config.background_workers,
+                                           thread_name_prefix="game-background")
+
+        self.story_prompt = None
+        self.option_pool: Optional[OptionPool] = None
+        self.state_batcher: Optional[MicroBatcher] = None
+        self.refresh()
+
+    def provider_for(self, chain_name: str):
+        """Get the provider for a chain, cached if the chain opted in"""
+        if chain_name == "character" and self.config.option_pool_size > 0:
+            # The option pool provides variety; a cached menu would be served to every new game
+            return self.storyteller
+        if self.cached_storyteller is not None and chain_name in self.config.cached_chains:
+            return self.cached_storyteller
+        return self.storyteller
+
+    def refresh(self) -> bool:
+        """Rebuild the chains if any prompt template changed on disk.
+
+        Returns:
+            True if the chains were rebuilt
+        """
+        system_path = self.config.system_prompt_path
+        story_template = STORY_TEMPLATE
+        if self.config.summarize_history:
+            story_template = SUMMARY_SECTION + story_template
+
+        with get_metrics_registry().span("template_load", source="chains"):
+            prompts = (
+                self.templates.get_chat_prompt(system_path, human_path=CHARACTER_SETUP_PATH),
+                self.templates.get_chat_prompt(system_path, human_template=story_template),
+                self.templates.get_chat_prompt(system_path, human_path=STATE_PROMPT_PATH),
+                self.templates.get_chat_prompt(system_path, human_path=SUMMARY_PROMPT_PATH)
+            )
+        # The registry hands out the same objects until a template file changes
+        if self.story_prompt is not None and all(new is current for new, current in zip(
+                prompts, (self.character_prompt, self.story_prompt, self.state_prompt, self.summary_prompt))):
+            return False
+        self.character_prompt, self.story_prompt, self.state_prompt, self.summary_prompt = prompts
+
+        # Character options chain
+        self.character_chain = self.character_prompt | self.provider_for("character") | StrOutputParser()
+
+        # Story continuation chain
+        self.story_chain = self.story_prompt | self.provider_for("story") | StrOutputParser()
+
+        # State extraction chain: asks for the changes made by the latest turn only
+        self.state_chain = self.state_prompt | self.provider_for("state") | self.state_parser
+        if self.config.state_batch_size > 1:
+            previous_batcher = self.state_batcher
+            self.state_batcher = MicroBatcher(
+                self.state_chain,
+                max_batch_size=self.config.state_batch_size,
+                max_wait=self.config.state_batch_wait_ms / 1000,
+                max_concurrency=self.config.state_batch_concurrency
+            )
+            if previous_batcher is not None:
+                self.executor.submit(previous_batcher.close)
+
+        # Story summary chain
+        self.summary_chain = self.summary_prompt | self.provider_for("summary") | StrOutputParser()
+
+        # Pre-generated option menus so new games start without an LLM call. Pools
+        # are per account, since refills are billed to the key of the chain they use
+        if self.config.option_pool_size > 0:
+            previous_pool = self.option_pool
+            self.option_pool = get_option_pool(
+                (self.config.provider.value, self.config.get_model_name(), self.config.get_account_id(),
+                 self.templates.get_text(system_path), self.templates.get_text(CHARACTER_SETUP_PATH)),
+                # Bypasses the cache (see provider_for) so the pool gets distinct menus
+                generate=partial(self.character_chain.invoke, {}),
+                directory=self.config.option_pool_dir,
+                size=self.config.option_pool_size,
+                max_uses=self.config.option_pool_max_uses
+            )
+            if previous_pool is not None:
+                release_option_pool(previous_pool)
+        return True
+
+    def get_cache_stats(self) -> dict:
+        """Get completion cache hit/miss counters"""
+        if self.response_cache is None:
+            return {}
+        return self.response_cache.stats()
+
+    def close(self) -> None:
+        """Wait for background work and release the executor and option pool"""
+        if self.state_batcher is not None:
+            self.state_batcher.close()
+        self.executor.shutdown(wait=True)
+        if self.option_pool is not None:
+            release_option_pool(self.option_pool)
+            self.option_pool = None
@@ -1,51 +1,203 @@
 from enum import Enum
 from pydantic import SecretStr
-from utils.utils import get_api_key
-from typing import Optional
-from routers.chat_openai import ChatOpenAIProvider
-from routers.chat_openrouter import ChatOpenRouter
-from dotenv import load_dotenv
+from utils.utils import load_environment_variables
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import hashlib
+import logging
 import os
 
-# Load environment variables from .env file
-load_dotenv()
+# Provider modules pull in LangChain and the OpenAI SDK, so they are imported
+# when a provider is built rather than with the configuration
+if TYPE_CHECKING:
+    from routers.cache import ResponseCache
 
 class ChatProvider(Enum):
     OPENAI = "openai"
     OPENROUTER = "openrouter"
     LLAMA = "llama"
+    MOCK = "mock"
+
+# Default prompt token budgets per model. These cap the input sent with each
+# chain call, which drives both cost and latency, and leave room for output
+# on models with small context windows.
+PROMPT_TOKEN_BUDGETS = {
+    "gpt-4o-mini": 8000,
+    "gpt-4o": 8000,
+    "gpt-3.5-turbo": 6000,
+    "cloud-sambanova-llama-3-405b-instruct": 6000,
+    "gryphe/mythomax-l2-13b:free": 3000,
+    "google/gemma-2-9b-it:free": 6000,
+}
+DEFAULT_PROMPT_TOKEN_BUDGET = 4000
+
+# Prices in dollars per 1K tokens. Models not listed fall back to their
+# provider's default price.
+MODEL_PRICES = {
+    "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
+    "gpt-4o": {"input": 0.005, "output": 0.015},
+    "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015},
+    "o1-mini": {"input": 0.003, "output": 0.012},
+    "o1": {"input": 0.015, "output": 0.06},
+    "cloud-sambanova-llama-3-405b-instruct": {"input": 0.0, "output": 0.0},
+    "google/gemma-2-9b-it:free": {"input": 0.0, "output": 0.0},
+    "liquid/lfm-40b:free": {"input": 0.0, "output": 0.0},
+    "nousresearch/hermes-3-llama-3.1-405b:free": {"input": 0.0, "output": 0.0},
+    "meta-llama/llama-3.1-405b-instruct:free": {"input": 0.0, "output": 0.0},
+    "gryphe/mythomax-l2-13b:free": {"input": 0.0, "output": 0.0},
+    "mock-storyteller": {"input": 0.0, "output": 0.0},
+}
+PROVIDER_DEFAULT_PRICES = {
+    ChatProvider.OPENAI: {"input": 0.00015, "output": 0.0006},
+    ChatProvider.OPENROUTER: {"input": 0.001, "output": 0.002},
+    ChatProvider.LLAMA: {"input": 0.0, "output": 0.0},  # Free
+    ChatProvider.MOCK: {"input": 0.0, "output": 0.0},
+}
+
+# Default request and token budgets per minute, kept a little under the
+# providers' published limits for their entry tiers. None means unlimited.
+PROVIDER_RATE_LIMITS = {
+    ChatProvider.OPENAI: {"requests_per_minute": 450, "tokens_per_minute": 180000},
+    ChatProvider.OPENROUTER: {"requests_per_minute": 18, "tokens_per_minute": None},
+    ChatProvider.LLAMA: {"requests_per_minute": None, "tokens_per_minute": None},
+    ChatProvider.MOCK: {"requests_per_minute": None, "tokens_per_minute": None},
+}
 
 class ChatConfig:
     """Configuration class for chat parameters"""
+
+    # Settings each GameEngine reads for its own session. Every other
+    # attribute configures the provider and chains that sessions share
+    SESSION_FIELDS = frozenset({
+        "max_history", "max_prompt_tokens", "summary_max_words", "trace_path",
+        "journal_dir", "journal_fsync", "journal_checkpoint_every",
+        "input_tokens", "output_tokens"
+    })
+
     def __init__(self, 
                  provider: ChatProvider = ChatProvider.OPENROUTER,
                  openrouter_model: str = "gryphe/mythomax-l2-13b:free",
                  openai_model: str = "gpt-4o-mini",
                  llama_model: str = "cloud-sambanova-llama-3-405b-instruct",
+                 mock_model: str = "mock-storyteller",
                  system_prompt_path: str = "templates/system_prompt.md",
-                 max_history: int = 10,
+                 max_history: Optional[int] = None,
                  api_key: Optional[str] = None,
-                 base_url: Optional[str] = None):
+                 base_url: Optional[str] = None,
+                 max_prompt_tokens: Optional[int] = None,
+                 option_pool_size: int = 8,
+                 option_pool_max_uses: int = 3,
+                 option_pool_dir: str = ".cache/option_pool",
+                 cache_backend: Optional[str] = "memory",
+                 cache_path: str = ".cache/responses.sqlite",
+                 cache_max_entries: int = 1000,
+                 cache_ttl: Optional[float] = None,
+                 cached_chains: Tuple[str, ...] = ("character", "state"),
+                 summarize_history: bool = True,
+                 summary_max_words: int = 200,
+                 background_workers: int = 4,
+                 http_max_connections: int = 100,
+                 http_max_keepalive: int = 20,
+                 http_keepalive_expiry: float = 30.0,
+                 request_timeout: float = 60.0,
+                 mock_options: Optional[dict] = None,
+                 trace_path: Optional[str] = None,
+                 state_batch_size: int = 1,
+                 state_batch_wait_ms: float = 25.0,
+                 state_batch_concurrency: int = 32,
+                 fallback_providers: Tuple[ChatProvider, ...] = (),
+                 hedge_requests: bool = False,
+                 hedge_delay: float = 2.0,
+                 rate_limits: Optional[Dict[ChatProvider, dict]] = None,
+                 rate_limit_max_wait: Optional[float] = 30.0,
+                 max_attempts: int = 3,
+                 retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 20.0,
+                 retry_budget_ratio: float = 0.2,
+                 circuit_failure_threshold: int = 5,
+                 circuit_reset_timeout: float = 30.0,
+                 journal_dir: Optional[str] = None,
+                 journal_fsync: str = "checkpoint",
+                 journal_checkpoint_every: int = 20):
         
-        # Load environment variables if not already loaded
-        if not os.getenv('OPENAI_API_KEY'):
-            load_dotenv()
-            
+        # Load .env once per process
+        load_environment_variables()
+
         self.provider = provider
         self.openrouter_model = openrouter_model
         self.openai_model = openai_model
         self.llama_model = llama_model
+        self.mock_model = mock_model
         self.system_prompt_path = system_prompt_path
         self.max_history = max_history
+        self.max_prompt_tokens = max_prompt_tokens
+        self.option_pool_size = option_pool_size
+        self.option_pool_max_uses = option_pool_max_uses
+        self.option_pool_dir = option_pool_dir
+        self.cache_backend = cache_backend
+        self.cache_path = cache_path
+        self.cache_max_entries = cache_max_entries
+        self.cache_ttl = cache_ttl
+        self.cached_chains = tuple(cached_chains)
+        self.summarize_history = summarize_history
+        self.summary_max_words = summary_max_words
+        self.background_workers = background_workers
+        self.http_max_connections = http_max_connections
+        self.http_max_keepalive = http_max_keepalive
+        self.http_keepalive_expiry = http_keepalive_expiry
+        self.request_timeout = request_timeout
+        # Latency, seed, error rate etc. for the offline mock provider
+        self.mock_options = dict(mock_options or {})
+        # JSON-lines file receiving a span for every engine phase
+        self.trace_path = trace_path
+        # Opt-in batching of threaded state extraction across sessions; a batch
+        # size of 1 (the default) extracts each turn's state on its own
+        self.state_batch_size = state_batch_size
+        self.state_batch_wait_ms = state_batch_wait_ms
+        self.state_batch_concurrency = state_batch_concurrency
+        # Other providers to route to when the primary is slow or failing
+        self.fallback_providers = tuple(p for p in fallback_providers if p != provider)
+        # Send a duplicate request to a fallback when the primary is slow. Off by
+        # default: the losing request is still billed but its usage is never reported
+        self.hedge_requests = hedge_requests
+        # Hedge delay used until a provider has enough latency samples
+        self.hedge_delay = hedge_delay
+        # Per-provider overrides of PROVIDER_RATE_LIMITS
+        self.rate_limits = dict(rate_limits or {})
+        # How long background calls wait for the rate limit before giving up
+        self.rate_limit_max_wait = rate_limit_max_wait
+        # Attempts per call (including the first) for transient provider errors
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Retries allowed per request made, shared by all calls to an endpoint
+        self.retry_budget_ratio = retry_budget_ratio
+        self.circuit_failure_threshold = circuit_failure_threshold
+        self.circuit_reset_timeout = circuit_reset_timeout
+        # Directory of per-session journals; None disables journaling
+        self.journal_dir = journal_dir
+        # When journal records are forced to disk: always, checkpoint or never
+        self.journal_fsync = journal_fsync
+        self.journal_checkpoint_every = journal_checkpoint_every
         self.api_key = api_key
         self.base_url = base_url
         self.input_tokens = 0
         self.output_tokens = 0
 
-    def get_api_key(self) -> SecretStr:
-        """Get the appropriate API key based on provider"""
-        if self.api_key:
+    def chain_settings(self) -> Dict[str, object]:
+        """The settings that determine a shared ChainSet, without credentials"""
+        return {
+            name: value for name, value in sorted(vars(self).items())
+            if name not in self.SESSION_FIELDS and name != "api_key"
+        }
+
+    def get_api_key(self, provider: Optional[ChatProvider] = None) -> SecretStr:
+        """Get the appropriate API key based on provider (the primary one by default)"""
+        provider = provider or self.provider
+        # An explicit key belongs to the primary provider
+        if self.api_key and provider == self.provider:
             return SecretStr(self.api_key)
+        if provider == ChatProvider.MOCK:
+            return SecretStr("mock")
             
         # Get from environment variables
         api_key_map = {
@@ -53,68 +205,215 @@ class ChatConfig:
             ChatProvider.OPENAI: 'OPENAI_API_KEY',
             ChatProvider.LLAMA: 'PARASAIL_API_KEY'
         }
-        env_key = os.getenv(api_key_map[self.provider])
+        env_key = os.getenv(api_key_map[provider])
         if not env_key:
-            raise ValueError(f"Missing API key for provider {self.provider}")
+            raise ValueError(f"Missing API key for provider {provider}")
         return SecretStr(env_key)
 
-    def get_base_url(self) -> Optional[str]:
+    def get_base_url(self, provider: Optional[ChatProvider] = None) -> Optional[str]:
         """Get the base URL if needed"""
-        if self.base_url:
+        provider = provider or self.provider
+        if self.base_url and provider == self.provider:
             return self.base_url
-        if self.provider == ChatProvider.LLAMA:
+        if provider == ChatProvider.LLAMA:
             base_url = os.getenv('PARASAIL_BASE_URL')
             if not base_url:
                 raise ValueError("Missing PARASAIL_BASE_URL in environment variables")
             return base_url
         return None
 
-    def get_model_name(self) -> str:
+    def get_account_id(self, provider: Optional[ChatProvider] = None) -> str:
+        """Get a fingerprint of the account a provider bills, from its API key and base URL"""
+        provider = provider or self.provider
+        account = f"{self.get_api_key(provider).get_secret_value()}\x00{self.get_base_url(provider)}"
+        return hashlib.sha256(account.encode("utf-8")).hexdigest()[:16]
+
+    def get_model_name(self, provider: Optional[ChatProvider] = None) -> str:
         """Get the appropriate model name based on provider"""
-        if self.provider == ChatProvider.OPENROUTER:
+        provider = provider or self.provider
+        if provider == ChatProvider.OPENROUTER:
             return self.openrouter_model
-        elif self.provider == ChatProvider.LLAMA:
+        elif provider == ChatProvider.LLAMA:
             return self.llama_model
+        elif provider == ChatProvider.MOCK:
+            return self.mock_model
         return self.openai_model
 
+    def get_prompt_budget(self) -> int:
+        """Get the prompt token budget for the story chain"""
+        if self.max_prompt_tokens:
+            return self.max_prompt_tokens
+        return PROMPT_TOKEN_BUDGETS.get(self.get_model_name(), DEFAULT_PROMPT_TOKEN_BUDGET)
+
+    def get_journal_path(self, session_id: str) -> str:
+        """Get the journal file for a session"""
+        if not self.journal_dir:
+            raise ValueError("Journaling is disabled; set journal_dir")
+        if not session_id or os.sep in session_id or session_id.startswith("."):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        return os.path.join(self.journal_dir, f"{session_id}.jsonl")
+
+    def get_response_cache(self) -> Optional["ResponseCache"]:
+        """Get the shared completion cache, or None if caching is disabled"""
+        if not self.cache_backend or not self.cached_chains:
+            return None
+        from routers.cache import get_response_cache
+        return get_response_cache(
+            backend=self.cache_backend,
+            path=self.cache_path,
+            max_entries=self.cache_max_entries,
+            ttl=self.cache_ttl
+        )
+
     def get_chat_provider(self, **kwargs):
-        """Get the appropriate chat provider instance based on configuration"""
-        model_name = self.get_model_name()
-        api_key = self.get_api_key()
-        base_url = self.get_base_url()
+        """Get the appropriate chat provider instance based on configuration.
+
+        With fallback providers configured, returns a ChatRouter that sends
+        each call to the fastest healthy provider.
+        """
+        # Ask for usage on streamed responses so token counts survive streaming
+        kwargs.setdefault("stream_usage", True)
+        if not self.fallback_providers:
+            return self._build_provider(self.provider, **kwargs)
+
+        backends = [self._build_provider(self.provider, **kwargs)]
+        for provider in self.fallback_providers:
+            try:
+                backends.append(self._build_provider(provider, **kwargs))
+            except ValueError as e:
+                logging.error(f"Skipping fallback provider {provider.value}: {str(e)}")
+        if len(backends) == 1:
+            return backends[0]
+        from routers.chat_router import ChatRouter
+        return ChatRouter(
+            backends=backends,
+            hedge=self.hedge_requests,
+            initial_hedge_delay=self.hedge_delay
+        )
 
-        if self.provider == ChatProvider.LLAMA:
+    def get_rate_limits(self, provider: Optional[ChatProvider] = None) -> dict:
+        """Get the requests and tokens per minute budgets for a provider"""
+        provider = provider or self.provider
+        return {**PROVIDER_RATE_LIMITS.get(provider, {}), **self.rate_limits.get(provider, {})}
+
+    def _build_provider(self, provider: ChatProvider, **kwargs):
+        """Create the chat model for one provider behind its rate limiter and retry layer"""
+        from routers.resilience import ResilientChatProvider, get_endpoint
+        from routers.scheduler import ScheduledChatProvider, get_request_scheduler
+        from .metrics import get_metrics_registry
+
+        chat_model = self._create_provider(provider, **kwargs)
+        model_name = self.get_model_name(provider)
+        limits = self.get_rate_limits(provider)
+        if limits.get("requests_per_minute") or limits.get("tokens_per_minute"):
+            # Budgets are per account and model, so sessions sharing both share a scheduler
+            scheduler = get_request_scheduler(
+                name=provider.value,
+                key=f"{model_name}:{self.get_account_id(provider)}",
+                requests_per_minute=limits.get("requests_per_minute"),
+                tokens_per_minute=limits.get("tokens_per_minute"),
+                max_wait=self.rate_limit_max_wait,
+                metrics=get_metrics_registry()
+            )
+            chat_model = ScheduledChatProvider(chat_model, scheduler)
+
+        # Retries go back through the rate limiter, and share a breaker per endpoint and
+        # account, so one exhausted key cannot open the circuit for every other player
+        endpoint = get_endpoint(
+            f"{provider.value}:{model_name}",
+            account=self.get_account_id(provider),
+            failure_threshold=self.circuit_failure_threshold,
+            reset_timeout=self.circuit_reset_timeout,
+            retry_budget_ratio=self.retry_budget_ratio
+        )
+        return ResilientChatProvider(
+            chat_model,
+            endpoint,
+            max_attempts=self.max_attempts,
+            base_delay=self.retry_base_delay,
+            max_delay=self.retry_max_delay,
+            metrics=get_metrics_registry()
+        )
+
+    def _create_provider(self, provider: ChatProvider, **kwargs):
+        """Create the chat model for one provider"""
+        if provider in (ChatProvider.OPENAI, ChatProvider.LLAMA):
+            from routers.chat_openai import ChatOpenAIProvider
+        elif provider == ChatProvider.OPENROUTER:
+            from routers.chat_openrouter import ChatOpenRouter, OpenRouterConfig
+        elif provider == ChatProvider.MOCK:
+            from routers.chat_mock import ChatMock
+        model_name = self.get_model_name(provider)
+        api_key = self.get_api_key(provider)
+        base_url = self.get_base_url(provider)
+
+        if provider == ChatProvider.LLAMA:
             return ChatOpenAIProvider(
                 model_name=model_name,
                 api_key=api_key,
                 base_url=base_url,
+                timeout=self.request_timeout,
+                # Retries are handled by ResilientChatProvider
+                max_retries=0,
+                **self._http_client_kwargs(base_url),
                 **kwargs
             )
-        elif self.provider == ChatProvider.OPENAI:
+        elif provider == ChatProvider.OPENAI:
             return ChatOpenAIProvider(
                 model_name=model_name,
                 api_key=api_key,
+                timeout=self.request_timeout,
+                max_retries=0,
+                **self._http_client_kwargs(base_url),
                 **kwargs
             )
-        elif self.provider == ChatProvider.OPENROUTER:
+        elif provider == ChatProvider.OPENROUTER:
+            router_config = OpenRouterConfig(
+                api_key=api_key,
+                timeout=self.request_timeout,
+                max_retries=min(max(self.max_attempts, 1), 5)
+            )
             return ChatOpenRouter(
                 model_name=model_name,
                 api_key=api_key,
+                config=router_config,
+                max_retries=0,
+                **self._http_client_kwargs(router_config.base_url),
                 **kwargs
             )
+        elif provider == ChatProvider.MOCK:
+            return ChatMock(
+                model_name=model_name,
+                **{**self.mock_options, **kwargs}
+            )
         else:
-            raise ValueError(f"Unsupported provider: {self.provider}")
-
-    def get_token_costs(self) -> dict:
-        """Get the cost per 1K tokens for the current model"""
-        costs = {
-            ChatProvider.OPENAI: {
-                "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
-                "gpt-4o": {"input": 0.005, "output": 0.015},
-                "o1-mini": {"input": 0.003, "output": 0.012},
-                "o1": {"input": 0.015, "output": 0.06}
-            },
-            ChatProvider.LLAMA: {"input": 0.0, "output": 0.0},  # Free
-            ChatProvider.OPENROUTER: {"input": 0.001, "output": 0.002}  # Example costs
-        }
-        return costs.get(self.provider, {"input": 0.0, "output": 0.0})
\ No newline at end of file
+            raise ValueError(f"Unsupported provider: {provider}")
+
+    def _http_client_kwargs(self, base_url: Optional[str]) -> dict:
+        """Get the shared pooled HTTP clients for an endpoint as provider kwargs"""
+        from routers.http_pool import get_http_clients
+        http_client, http_async_client = get_http_clients(
+            base_url=base_url,
+            max_connections=self.http_max_connections,
+            max_keepalive_connections=self.http_max_keepalive,
+            keepalive_expiry=self.http_keepalive_expiry,
+            timeout=self.request_timeout
+        )
+        return {"http_client": http_client, "http_async_client": http_async_client}
+
+    def get_token_costs(self, model_name: Optional[str] = None) -> dict:
+        """Get the cost per 1K tokens for a model (the primary provider's by default).
+
+        Dated snapshots reported by providers, such as ``gpt-4o-mini-2024-07-18``,
+        are priced as their base model.
+        """
+        model_name = model_name or self.get_model_name()
+        price = MODEL_PRICES.get(model_name)
+        if price is None:
+            base = max((name for name in MODEL_PRICES if model_name.startswith(f"{name}-")), key=len, default=None)
+            price = MODEL_PRICES.get(base)
+        if price is None:
+            provider = next((p for p in (self.provider, *self.fallback_providers)
+                             if self.get_model_name(p) == model_name), self.provider)
+            price = PROVIDER_DEFAULT_PRICES.get(provider, {"input": 0.0, "output": 0.0})
+        return dict(price)
\ No newline at end of file
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Sequence
+from langchain_core.messages import BaseMessage
+import logging
+
+# Rough characters-per-token ratio used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Per-message framing overhead (role markers, separators) in chat prompts
+TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=None)
+def load_encoding(model_name: str):
+    """Load a tiktoken encoding for the model once per process, or None to use the estimate"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # Non-OpenAI models: cl100k is a reasonable approximation
+        pass
+    except Exception as e:
+        logging.warning(f"Could not load tokenizer for {model_name}: {str(e)}")
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"Could not load fallback tokenizer: {str(e)}")
+        return None
+
+
+class TokenCounter:
+    """Counts tokens for message text, caching the count per message content.
+
+    With ``use_tokenizer=False`` text is always counted with the character
+    estimate, so counts do not depend on whether tiktoken and its encodings
+    are available.
+    """
+
+    def __init__(self, model_name: str, cache_size: int = 4096, use_tokenizer: bool = True):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._encoding = load_encoding(model_name) if use_tokenizer else None
+
+    def count(self, text: Optional[str]) -> int:
+        """Count the tokens in a piece of text"""
+        if not text:
+            return 0
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+
+        if self._encoding is not None:
+            tokens = len(self._encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = len(text) // CHARS_PER_TOKEN + 1
+
+        self._cache[text] = tokens
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: BaseMessage) -> int:
+        """Count the tokens a message contributes to a prompt"""
+        return self.count(message.content) + TOKENS_PER_MESSAGE
+
+    def count_messages(self, messages: Sequence[BaseMessage]) -> int:
+        """Count the tokens for a sequence of messages"""
+        return sum(self.count_message(message) for message in messages)
+
+
+class ContextWindow:
+    """Selects the conversation history that fits within a prompt token budget.
+
+    The first ``pinned`` messages (character setup and selection) are always
+    kept, as is the most recent message. The remaining budget is filled with
+    the newest messages first.
+    """
+
+    def __init__(self, counter: TokenCounter, pinned: int = 3):
+        self.counter = counter
+        self.pinned = pinned
+
+    def fit_start(self, messages: Sequence[BaseMessage], budget: int) -> int:
+        """Find where the kept suffix of the history starts.
+
+        Args:
+            messages: Conversation history, oldest first (without the system message)
+            budget: Tokens available for the history
+
+        Returns:
+            Index of the oldest unpinned message that still fits
+        """
+        if len(messages) <= self.pinned:
+            return len(messages)
+
+        remaining = budget - self.counter.count_messages(messages[:self.pinned])
+
+        # Walk back from the newest message, always keeping the latest one
+        start = len(messages) - 1
+        remaining -= self.counter.count_message(messages[start])
+        while start > self.pinned:
+            cost = self.counter.count_message(messages[start - 1])
+            if cost > remaining:
+                break
+            remaining -= cost
+            start -= 1
+        return start
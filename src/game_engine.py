@@ -1,58 +1,177 @@
-from typing import List, Optional
-from langchain.schema import SystemMessage, HumanMessage, AIMessage, BaseMessage
+from typing import AsyncIterator, Iterator, List, Optional, Set, Union
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from pathlib import Path
 import logging
-from .config import ChatConfig
+from .config import ChatConfig, ChatProvider
+from .context import ContextWindow, TokenCounter
+from .transcript import Transcript
+from .chains import CHARACTER_SETUP_PATH, ChainSet
+from .summary_memory import SummaryMemory
+from .game_state import GameState, GameStateUpdate
+from .metrics import get_metrics_registry
+from .accounting import TokenLedger, UsageCallbackHandler
+from .journal import SessionJournal, load_journal
+from utils.utils import ainput
 import json
-from langchain.callbacks import get_openai_callback
+import time
+import asyncio
+import contextvars
+import uuid
+from concurrent.futures import Future
 
 class GameEngine:
-    def __init__(self, config: ChatConfig):
+    # Character setup prompt, option menu and selection are never trimmed
+    PINNED_MESSAGES = 3
+
+    # Tokens used by the fixed text of the story prompt template
+    PROMPT_TEMPLATE_TOKENS = 32
+
+    def __init__(self, config: ChatConfig, chains: Optional[ChainSet] = None, session_id: Optional[str] = None):
+        """
+        Args:
+            config: Chat configuration for this game
+            chains: Provider and chains shared with other sessions; a private
+                set is created if not given
+            session_id: Names the session's journal; a random id is used if not given
+        """
         self.config = config
+        self.session_id = session_id or uuid.uuid4().hex
+        self._owns_chains = chains is None
+        self.chains = chains or ChainSet(config)
+        self.storyteller = self.chains.storyteller
+
+        # Spans, latency histograms and error/retry counters for every phase
+        self.metrics = get_metrics_registry()
+        if config.trace_path:
+            self.metrics.enable_tracing(config.trace_path)
+
         self.messages: List[BaseMessage] = []
-        self.storyteller = config.get_chat_provider()
+        # Rendered history (without the system message) for the story prompt
+        self.transcript = Transcript(pinned=self.PINNED_MESSAGES)
+
+        # Token-aware history window for the story prompt. The mock provider bills
+        # four characters per token, so mock sessions count the same way
+        self.token_counter = TokenCounter(config.get_model_name(),
+                                          use_tokenizer=config.provider != ChatProvider.MOCK)
+        self.context_window = ContextWindow(self.token_counter, pinned=self.PINNED_MESSAGES)
+        self._system_prompt_tokens = self.token_counter.count(self._load_prompt(config.system_prompt_path))
 
-        # initialize state message
+        # Structured game state and its compact rendering for the story prompt
+        self.game_state = GameState()
         self.state_message = None
+
+        # State extraction runs in the background after each narration
+        self._pending_state: Optional[Union[Future, asyncio.Task]] = None
+        # Extraction tasks until they finish: the event loop only keeps weak
+        # references, and _pending_state is cleared or replaced before then
+        self._state_tasks: Set[asyncio.Task] = set()
+        self._turn_count = 0
+        self._state_turn = 0
+
+        # Turns that leave the history window are folded into a running summary
+        self.summary_memory: Optional[SummaryMemory] = None
+        if config.summarize_history:
+            self.summary_memory = SummaryMemory(self._summarize, self.chains.executor,
+                                                on_update=self._journal_summary)
         
-        # Initialize chains
-        self._setup_chains()
-        
-        self.total_input_tokens = 0
-        self.total_output_tokens = 0
-
-    def _setup_chains(self):
-        """Setup the various processing chains"""
-        # Character options chain
-        character_prompt = ChatPromptTemplate.from_messages([
-            ("system", self._load_prompt(self.config.system_prompt_path)),
-            ("human", self._load_prompt("templates/character_setting_setup.md"))
-        ])
-        self.character_chain = character_prompt | self.storyteller | StrOutputParser()
-        
-        # Story continuation chain
-        story_prompt = ChatPromptTemplate.from_messages([
-            ("system", self._load_prompt(self.config.system_prompt_path)),
-            ("human", "Previous conversation:\n{history}\n\nCurrent state:\n{state_message}\n\nCurrent input:\n{user_input}")
-        ])
-        self.story_chain = story_prompt | self.storyteller | StrOutputParser()
+        # Token usage and cost per chain and turn, from whatever the provider reports
+        self.ledger = TokenLedger(config.get_token_costs(), price_for=config.get_token_costs)
+        self._callbacks = [
+            self.metrics.callback_handler,
+            UsageCallbackHandler(self.ledger, self.token_counter, self.metrics)
+        ]
 
-        # State extraction chain
-        state_prompt = ChatPromptTemplate.from_messages([
-            ("system", self._load_prompt(self.config.system_prompt_path)),
-            ("human", "{story_text} \n Extract the current state of the story.")
-        ])
-        self.state_chain = state_prompt | self.storyteller | StrOutputParser()
+        # Per-phase wall-clock timings (seconds)
+        self.last_turn_timings: dict = {}
+        self._timing_totals: dict = {}
+
+        # Append-only record of the session for crash recovery and resume
+        self.journal: Optional[SessionJournal] = None
+        if config.journal_dir:
+            self.journal = SessionJournal(
+                config.get_journal_path(self.session_id),
+                fsync=config.journal_fsync,
+                checkpoint_every=config.journal_checkpoint_every
+            )
+        # Messages added and trimmed since the last journal record
+        self._journal_pending: List[BaseMessage] = []
+        self._journal_dropped = 0
+
+    @classmethod
+    def from_journal(cls,
+                     config: ChatConfig,
+                     session_id: str,
+                     chains: Optional[ChainSet] = None,
+                     from_checkpoint: bool = True) -> "GameEngine":
+        """Resume a session from its journal in ``config.journal_dir``.
+
+        Args:
+            config: Chat configuration for the game
+            session_id: Session whose journal to load
+            chains: Provider and chains shared with other sessions
+            from_checkpoint: Start from the last checkpoint, so resuming
+                replays at most ``journal_checkpoint_every`` turns; if False
+                the whole journal is replayed
+
+        Returns:
+            An engine with the journaled messages, game state and summary,
+            appending further turns to the same journal
+        """
+        if not config.journal_dir:
+            raise ValueError("Resuming a session needs ChatConfig(journal_dir=...)")
+        snapshot = load_journal(config.get_journal_path(session_id), cls.PINNED_MESSAGES, from_checkpoint)
+        engine = cls(config, chains=chains, session_id=session_id)
+        engine._set_messages(snapshot.messages)
+        engine._turn_count = snapshot.turn
+        if snapshot.state is not None:
+            engine.game_state = GameState(**snapshot.state)
+            engine.state_message = engine.game_state.render()
+        engine._state_turn = snapshot.state_turn
+        if engine.summary_memory is not None:
+            engine.summary_memory.reset(snapshot.summary, snapshot.backlog, snapshot.folded)
+        return engine
+
+    def _state_snapshot(self) -> Optional[dict]:
+        """The current game state for the journal, or None before the first extraction"""
+        return self.game_state.model_dump(exclude_defaults=True) if self.state_message else None
+
+    def _journal_turn(self) -> None:
+        """Record the finished turn, and a checkpoint when one is due"""
+        if self.journal is None:
+            return
+        turn = self._turn_count
+        usage = self.ledger.for_turn(turn)
+        self.journal.write_turn(
+            turn,
+            self._journal_pending,
+            self._journal_dropped,
+            self._state_snapshot(),
+            self._state_turn,
+            tokens={key: usage[key] for key in ("input_tokens", "output_tokens", "estimated_cost")},
+            timings=self.last_turn_timings
+        )
+        self._journal_pending = []
+        self._journal_dropped = 0
+        if self.journal.checkpoint_due(turn):
+            summary, folded, backlog = ("", 0, [])
+            if self.summary_memory is not None:
+                summary, folded, backlog = self.summary_memory.snapshot()
+            self.journal.write_checkpoint(turn, self.messages, self._state_snapshot(), self._state_turn,
+                                          summary, folded, backlog)
+
+    def _journal_summary(self, summary: str, folded: int) -> None:
+        """Record a summary update (background thread)"""
+        if self.journal is not None:
+            self.journal.write_summary(summary, folded)
+
+    def get_cache_stats(self) -> dict:
+        """Get completion cache hit/miss counters"""
+        return self.chains.get_cache_stats()
 
     def _load_prompt(self, path: str) -> str:
-        """Load prompt from file"""
-        try:
-            return Path(path).read_text(encoding="utf-8").strip()
-        except FileNotFoundError as e:
-            logging.error(f"Prompt file not found: {path}")
-            raise
+        """Load prompt from the shared template registry"""
+        with self.metrics.span("template_load", source="engine"):
+            return self.chains.templates.get_text(path)
 
     def _format_conversation_history(self, skip_system: bool = True, start_idx: int = 1) -> str:
         """Format conversation history into a string.
@@ -64,152 +183,620 @@ class GameEngine:
         Returns:
             Formatted conversation history string
         """
+        if skip_system and start_idx == 1:
+            return self.transcript.text
         messages_to_format = self.messages[start_idx:] if skip_system else self.messages
+        return self._format_messages(messages_to_format)
+
+    def _set_messages(self, messages: List[BaseMessage]) -> None:
+        """Replace the conversation history"""
+        self.messages = list(messages)
+        self.transcript.clear()
+        self.transcript.extend(self.messages[1:])
+
+    def _add_message(self, message: BaseMessage) -> None:
+        """Append a message to the conversation history"""
+        self.messages.append(message)
+        self.transcript.append(message)
+        if self.journal is not None:
+            self._journal_pending.append(message)
+
+    @staticmethod
+    def _format_messages(messages: List[BaseMessage]) -> str:
+        """Format a list of messages into a conversation string"""
         return "\n".join([
             f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
-            for msg in messages_to_format
+            for msg in messages
         ])
 
-    def initialize_game(self, character_selection: Optional[str] = None):
-        """Setup initial game state and prompts"""
-        # Get character options using the character chain
-        options_text = self.character_chain.invoke({})
-        
-        # Store initial messages
-        self.messages = [
+    def _history_budget(self, prompt_budget: int, *prompt_texts: Optional[str]) -> int:
+        """Tokens left for history once the system prompt and other inputs are counted"""
+        reserved = self._system_prompt_tokens + self.PROMPT_TEMPLATE_TOKENS
+        reserved += sum(self.token_counter.count(text) for text in prompt_texts)
+        return prompt_budget - reserved
+
+    def _trim_history(self) -> None:
+        """Drop the oldest unpinned messages that no longer fit the story prompt budget"""
+        budget = self._history_budget(
+            self.config.get_prompt_budget(),
+            self._summary_text(),
+            self.state_message,
+            self.messages[-1].content
+        )
+        history = self.messages[1:]
+        start = self.context_window.fit_start(history, budget)
+
+        # Optional hard cap on the number of stored messages
+        max_history = self.config.max_history
+        if max_history:
+            start = max(start, len(history) - max(max_history - self.PINNED_MESSAGES, 1))
+
+        dropped = start - self.PINNED_MESSAGES
+        if dropped > 0:
+            if self.summary_memory is not None:
+                self.summary_memory.fold(history[self.PINNED_MESSAGES:start])
+            self.messages = [self.messages[0]] + history[:self.PINNED_MESSAGES] + history[start:]
+            self.transcript.drop(dropped)
+            self._journal_dropped += dropped
+
+    def _summary_text(self) -> Optional[str]:
+        """The story-so-far summary for the story prompt"""
+        return self.summary_memory.text if self.summary_memory is not None else None
+
+    def _summarize(self, summary: str, turns: str) -> str:
+        """Fold turns into the story summary (background thread)"""
+        started = time.perf_counter()
+        with self.metrics.span("chain", chain="summary"):
+            new_summary = self.chains.summary_chain.invoke({
+                "summary": summary,
+                "turns": turns,
+                "max_words": self.config.summary_max_words
+            }, config=self._run_config("summary", self._turn_count))
+        self._record_timing("summary", time.perf_counter() - started)
+        return new_summary.strip()
+
+    def _run_metadata(self, chain_name: str, turn: Optional[int] = None) -> dict:
+        """Metadata attributing a chain call to a chain and turn (default: the turn in progress)"""
+        return {"chain": chain_name, "turn": self._turn_count + 1 if turn is None else turn}
+
+    def _run_config(self, chain_name: str, turn: Optional[int] = None) -> dict:
+        """Runnable config tagging a chain call for the metrics and usage callbacks"""
+        return {
+            "callbacks": self._callbacks,
+            "metadata": self._run_metadata(chain_name, turn),
+            "run_name": chain_name
+        }
+
+    async def _agenerate(self,
+                         chain_name: str,
+                         prompt: ChatPromptTemplate,
+                         inputs: dict,
+                         turn: Optional[int] = None) -> str:
+        """Render a prompt and generate a reply with the provider's async API"""
+        with self.metrics.span("chain", chain=chain_name):
+            messages = await prompt.aformat_messages(**inputs)
+            result = await self.chains.provider_for(chain_name).agenerate_with_retry(
+                [messages], callbacks=self._callbacks, metadata=self._run_metadata(chain_name, turn)
+            )
+        return result.generations[0][0].text
+
+    def _get_options(self) -> str:
+        """Get a character/setting menu, from the pool when one is ready"""
+        if self.chains.option_pool is not None:
+            options_text = self.chains.option_pool.draw(self._run_config("option_pool", 0))
+            if options_text is not None:
+                return options_text
+
+        with self.metrics.span("chain", chain="character"):
+            options_text = self.chains.character_chain.invoke({}, config=self._run_config("character", 0))
+        if self.chains.option_pool is not None:
+            self.chains.option_pool.add(options_text, uses=1)
+        return options_text
+
+    async def _aget_options(self) -> str:
+        """Async version of _get_options"""
+        if self.chains.option_pool is not None:
+            options_text = self.chains.option_pool.draw(self._run_config("option_pool", 0))
+            if options_text is not None:
+                return options_text
+
+        options_text = await self._agenerate("character", self.chains.character_prompt, {}, 0)
+        if self.chains.option_pool is not None:
+            self.chains.option_pool.add(options_text, uses=1)
+        return options_text
+
+    @property
+    def options_offered(self) -> bool:
+        """Whether an option menu is stored and waiting for the player's selection"""
+        return len(self.messages) == 3 and isinstance(self.messages[-1], AIMessage)
+
+    def _store_options(self, options_text: str) -> None:
+        """Store the opening messages ending with the option menu"""
+        # A new game starts from a blank state
+        self.wait_for_state()
+        self.game_state = GameState()
+        self.state_message = None
+        if self.summary_memory is not None:
+            self.summary_memory.reset()
+
+        self._set_messages([
             SystemMessage(content=self._load_prompt(self.config.system_prompt_path)),
-            HumanMessage(content=self._load_prompt("templates/character_setting_setup.md")),
+            HumanMessage(content=self._load_prompt(CHARACTER_SETUP_PATH)),
             AIMessage(content=options_text)
-        ]
-        
-        # If no character selection provided, just return the options
-        if not character_selection:
-            return {
-                "options": options_text,
-                "initial_story": ""
-            }
-        
-        # Always add the character selection to messages
-        self.messages.extend([
-            HumanMessage(content=character_selection)
         ])
+        if self.journal is not None:
+            self._journal_pending = []
+            self._journal_dropped = 0
+            self.journal.write_start(self.messages, self._turn_count, self._state_turn)
+
+    def _add_selection(self, character_selection: str) -> Optional[dict]:
+        """Add the player's selection to the stored options.
+
+        Returns:
+            The story chain inputs for the opening scene, or None if no story
+            should be generated yet
+        """
+        if not self.options_offered:
+            raise ValueError("No character options have been offered; call offer_options() first")
+
+        # Always add the character selection to messages
+        self._add_message(HumanMessage(content=character_selection))
 
-        
         # Only proceed with story generation if character_selection isn't "Start the adventure!"
-        if character_selection != "Start the adventure!":
-            # Add start command and generate initial story
-            self.messages.append(HumanMessage(content="Start the adventure with the selected character and setting!"))
-            
-            # Use the new utility method
-            history = self._format_conversation_history(start_idx=1)  # Skip system message
-            
+        if character_selection == "Start the adventure!":
+            return None
+
+        # Add start command for the initial story
+        self._add_message(HumanMessage(content="Start the adventure with the selected character and setting!"))
+        return {
+            "history": self._format_conversation_history(start_idx=1),  # Skip system message
+            "summary": self._summary_text(),
+            "state_message": self.state_message,
+            "user_input": self.messages[-1].content
+        }
+
+    def offer_options(self) -> str:
+        """Start a new game by generating and storing the character/setting options.
+
+        Returns:
+            The option menu to show the player
+        """
+        with self.metrics.span("offer_options"):
+            options_text = self._get_options()
+            self._store_options(options_text)
+        return options_text
+
+    async def aoffer_options(self) -> str:
+        """Async version of offer_options"""
+        with self.metrics.span("offer_options"):
+            options_text = await self._aget_options()
+            self._store_options(options_text)
+        return options_text
+
+    def start_story(self, character_selection: str) -> str:
+        """Start the story from the options stored by offer_options.
+
+        Args:
+            character_selection: The player's reply to the option menu
+
+        Returns:
+            The opening scene, or an empty string for "Start the adventure!"
+        """
+        with self.metrics.span("start_story"):
+            with self.metrics.span("format_history"):
+                story_inputs = self._add_selection(character_selection)
+            if story_inputs is None:
+                return ""
+
             # Generate initial story response
-            initial_story = self.story_chain.invoke({
-                "history": history,
+            with self.metrics.span("chain", chain="story"):
+                initial_story = self.chains.story_chain.invoke(story_inputs, config=self._run_config("story"))
+            self._complete_turn(initial_story)
+            self._start_state_extraction()
+        return initial_story
+
+    async def astart_story(self, character_selection: str) -> str:
+        """Async version of start_story"""
+        with self.metrics.span("start_story"):
+            with self.metrics.span("format_history"):
+                story_inputs = self._add_selection(character_selection)
+            if story_inputs is None:
+                return ""
+
+            initial_story = await self._agenerate("story", self.chains.story_prompt, story_inputs)
+            self._complete_turn(initial_story)
+            self._astart_state_extraction()
+        return initial_story
+
+    def initialize_game(self, character_selection: Optional[str] = None):
+        """Setup initial game state and prompts.
+
+        Without a selection this offers the options. With a selection it starts
+        the story from the options already offered, generating them only if
+        none are waiting.
+        """
+        if not character_selection or not self.options_offered:
+            self.offer_options()
+        options_text = self.messages[2].content
+
+        initial_story = self.start_story(character_selection) if character_selection else ""
+        return {
+            "options": options_text,
+            "initial_story": initial_story
+        }
+
+    async def ainitialize_game(self, character_selection: Optional[str] = None):
+        """Async version of initialize_game"""
+        if not character_selection or not self.options_offered:
+            await self.aoffer_options()
+        options_text = self.messages[2].content
+
+        initial_story = await self.astart_story(character_selection) if character_selection else ""
+        return {
+            "options": options_text,
+            "initial_story": initial_story
+        }
+
+    @property
+    def state_is_fresh(self) -> bool:
+        """Whether state_message reflects the most recent narration"""
+        return self._state_turn == self._turn_count
+
+    def _record_timing(self, phase: str, seconds: float) -> None:
+        """Record the duration of a turn phase"""
+        self.last_turn_timings[phase] = seconds
+        count, total = self._timing_totals.get(phase, (0, 0.0))
+        self._timing_totals[phase] = (count + 1, total + seconds)
+
+    def get_timing_stats(self) -> dict:
+        """Get per-phase timing statistics in seconds"""
+        return {
+            phase: {
+                "count": count,
+                "total": round(total, 4),
+                "average": round(total / count, 4) if count else 0.0,
+                "last": round(self.last_turn_timings.get(phase, 0.0), 4)
+            }
+            for phase, (count, total) in self._timing_totals.items()
+        }
+
+    def wait_for_state(self, timeout: Optional[float] = None) -> None:
+        """Block until a pending background state extraction has finished.
+
+        Args:
+            timeout: Maximum number of seconds to wait (default: no limit)
+        """
+        pending = self._pending_state
+        if pending is None:
+            return
+        if isinstance(pending, asyncio.Task):
+            # Owned by an event loop; only the async path can await it
+            if not pending.done():
+                logging.warning("State extraction is running on an event loop; continuing with stale state")
+                return
+        else:
+            started = time.perf_counter()
+            with self.metrics.span("state_wait"):
+                try:
+                    pending.result(timeout=timeout)
+                except Exception as e:
+                    logging.error(f"Background state extraction failed: {str(e)}")
+            self._record_timing("state_wait", time.perf_counter() - started)
+        self._pending_state = None
+
+    async def await_state(self) -> None:
+        """Async version of wait_for_state"""
+        pending = self._pending_state
+        if pending is None:
+            return
+        started = time.perf_counter()
+        with self.metrics.span("state_wait"):
+            if isinstance(pending, asyncio.Task):
+                # Failures are logged by _state_task_done
+                await asyncio.wait({pending})
+            else:
+                try:
+                    await asyncio.wrap_future(pending)
+                except Exception as e:
+                    logging.error(f"Background state extraction failed: {str(e)}")
+        self._record_timing("state_wait", time.perf_counter() - started)
+        self._pending_state = None
+
+    def _prepare_turn(self, user_input: str) -> dict:
+        """Add the player's input to the history and build the story chain inputs"""
+        self._add_message(HumanMessage(content=user_input))
+        with self.metrics.span("trim_history"):
+            self._trim_history()
+        with self.metrics.span("format_history"):
+            return {
+                "history": self._format_conversation_history(skip_system=True),
+                "summary": self._summary_text(),
                 "state_message": self.state_message,
                 "user_input": self.messages[-1].content
-            })
-            self.messages.append(AIMessage(content=initial_story))
-            
-            return {
-                "options": options_text,
-                "initial_story": initial_story
             }
-        
-        # If it's just the initial "Start the adventure!" command, return only options
+
+    def _complete_turn(self, story_text: str) -> None:
+        """Record the narration for the turn"""
+        self._turn_count += 1
+
+        # Add AI response to messages
+        self._add_message(AIMessage(content=story_text))
+        self._journal_turn()
+
+    def _settle_turn(self, narration: str) -> bool:
+        """Settle a turn whose story call did not finish (error, cancellation or a closed stream).
+
+        Narration the player already saw is kept as the turn's reply; otherwise
+        the player's input is withdrawn, so no later prompt or journal record
+        carries a message without an answer.
+
+        Returns:
+            True if the partial narration was recorded as a turn
+        """
+        if narration:
+            self._complete_turn(narration)
+            return True
+        self.messages.pop()
+        self.transcript.pop()
+        if self.journal is not None and self._journal_pending:
+            self._journal_pending.pop()
+        return False
+
+    def _apply_state(self, turn: int, previous: GameState, update: GameStateUpdate, started: float) -> None:
+        """Apply an extracted state update unless a newer one already landed"""
+        self._record_timing("state", time.perf_counter() - started)
+        if turn > self._state_turn:
+            self.game_state = previous.apply(update)
+            self.state_message = self.game_state.render()
+            self._state_turn = turn
+            if self.journal is not None:
+                self.journal.write_state(turn, self._state_snapshot())
+
+    def _extract_state(self, turn: int, previous: GameState, state_inputs: dict, submitted: float) -> None:
+        """Run the state chain and store the result (background thread)"""
+        started = time.perf_counter()
+        self.metrics.observe("game_queue_seconds", started - submitted, queue="state")
+        with self.metrics.span("chain", chain="state"):
+            update = self.chains.state_chain.invoke(state_inputs, config=self._run_config("state", turn))
+        self._apply_state(turn, previous, update, started)
+
+    async def _aextract_state(self, turn: int, previous: GameState, state_inputs: dict) -> None:
+        """Run the state chain and store the result (asyncio task)"""
+        started = time.perf_counter()
+        update_text = await self._agenerate("state", self.chains.state_prompt, state_inputs, turn)
+        self._apply_state(turn, previous, self.chains.state_parser.parse(update_text), started)
+
+    def _state_inputs(self) -> dict:
+        """Build the state chain inputs from the previous state and the turn that just finished"""
         return {
-            "options": options_text,
-            "initial_story": ""
+            "previous_state": self.game_state.model_dump_json(exclude_defaults=True) or "{}",
+            "user_input": self.messages[-2].content,
+            "story_text": self.messages[-1].content,
+            "format_instructions": self.chains.state_parser.get_format_instructions()
         }
 
+    def _submit_state_batch(self) -> Future:
+        """Queue the state extraction with other sessions' extractions"""
+        turn, previous = self._turn_count, self.game_state
+        started = time.perf_counter()
+        return self.chains.state_batcher.submit(
+            self._state_inputs(),
+            config=self._run_config("state", turn),
+            callback=lambda update: self._apply_state(turn, previous, update, started)
+        )
+
+    def _start_state_extraction(self) -> None:
+        """Extract the state for the finished turn in a background thread"""
+        if self.chains.state_batcher is not None:
+            self._pending_state = self._submit_state_batch()
+            return
+        # Run in a copy of this context so the extraction joins the turn's trace
+        self._pending_state = self.chains.executor.submit(
+            contextvars.copy_context().run,
+            self._extract_state, self._turn_count, self.game_state, self._state_inputs(), time.perf_counter()
+        )
+
+    def _astart_state_extraction(self) -> None:
+        """Extract the state for the finished turn in an asyncio task.
+
+        Async sessions skip the state batcher: their extractions already run
+        concurrently on the event loop without holding a thread each.
+        """
+        task = asyncio.create_task(
+            self._aextract_state(self._turn_count, self.game_state, self._state_inputs())
+        )
+        self._state_tasks.add(task)
+        task.add_done_callback(self._state_task_done)
+        self._pending_state = task
+
+    def _state_task_done(self, task: asyncio.Task) -> None:
+        """Release a finished extraction task and report its failure"""
+        self._state_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Background state extraction failed: {str(task.exception())}")
+
     def process_turn(self, user_input: str) -> str:
         """Process a single game turn (UI version)"""
         try:
-            # Add user input to messages
-            self.messages.append(HumanMessage(content=user_input))
+            with self.metrics.span("turn"):
+                # The story prompt needs the previous turn's state
+                self.wait_for_state()
 
-            # Track tokens using callback
-            with get_openai_callback() as cb:
                 # Generate story continuation with history
-                history = self._format_conversation_history(skip_system=True)
-                story_text = self.story_chain.invoke({
-                    "history": history,
-                    "state_message": self.state_message,
-                    "user_input": self.messages[-1].content
-                })
-                
-                # Extract the current state from the story text
-                current_state = self.state_chain.invoke({
-                    "story_text": history + "\n\n" + story_text
-                })
+                started = time.perf_counter()
+                story_inputs = self._prepare_turn(user_input)
+                try:
+                    with self.metrics.span("chain", chain="story"):
+                        story_text = self.chains.story_chain.invoke(story_inputs, config=self._run_config("story"))
+                except BaseException:
+                    self._settle_turn("")
+                    raise
+                self._record_timing("story", time.perf_counter() - started)
 
-                # Update token counts
-                self.total_input_tokens += cb.prompt_tokens
-                self.total_output_tokens += cb.completion_tokens
+                self._complete_turn(story_text)
 
-            #print(f"\n#########################\nCurrent state: {current_state}\n#########################\n")
-            
-            # update state message
-            self.state_message = current_state
-            
-            # Add AI response to messages
-            self.messages.append(AIMessage(content=story_text))
-            
-            # Maintain conversation history
-            if len(self.messages) > self.config.max_history:
-                # Keep system message and at least the character selection messages
-                min_messages_to_keep = 4  # system + character setup + selection + initial story
-                keep_count = max(min_messages_to_keep, self.config.max_history)
-                self.messages = [self.messages[0]] + self.messages[-keep_count:]
-            
+                # Extract the current state off the critical path
+                self._start_state_extraction()
             return story_text
             
         except Exception as e:
             logging.error(f"Error processing turn: {str(e)}", exc_info=True)
             raise
 
+    async def aprocess_turn(self, user_input: str) -> str:
+        """Async version of process_turn"""
+        try:
+            with self.metrics.span("turn"):
+                await self.await_state()
+
+                started = time.perf_counter()
+                story_inputs = self._prepare_turn(user_input)
+                try:
+                    story_text = await self._agenerate("story", self.chains.story_prompt, story_inputs)
+                except BaseException:
+                    self._settle_turn("")
+                    raise
+                self._record_timing("story", time.perf_counter() - started)
+
+                self._complete_turn(story_text)
+                self._astart_state_extraction()
+            return story_text
+
+        except Exception as e:
+            logging.error(f"Error processing turn: {str(e)}", exc_info=True)
+            raise
+
+    def stream_turn(self, user_input: str) -> Iterator[str]:
+        """Process a single game turn, yielding narration chunks as they arrive.
+
+        The assembled narration is recorded and handed to state extraction
+        once the story chain finishes, exactly as in process_turn. If the
+        stream fails or is closed early (e.g. the client went away), the
+        chunks already yielded are recorded as the turn instead.
+        """
+        try:
+            with self.metrics.span("turn", mode="stream"):
+                self.wait_for_state()
+
+                started = time.perf_counter()
+                story_inputs = self._prepare_turn(user_input)
+                chunks = []
+                try:
+                    with self.metrics.span("chain", chain="story"):
+                        for chunk in self.chains.story_chain.stream(story_inputs, config=self._run_config("story")):
+                            chunks.append(chunk)
+                            yield chunk
+                except BaseException:
+                    if self._settle_turn("".join(chunks)):
+                        self._start_state_extraction()
+                    raise
+                story_text = "".join(chunks)
+                self._record_timing("story", time.perf_counter() - started)
+
+                self._complete_turn(story_text)
+                self._start_state_extraction()
+
+        except Exception as e:
+            logging.error(f"Error streaming turn: {str(e)}", exc_info=True)
+            raise
+
+    async def astream_turn(self, user_input: str) -> AsyncIterator[str]:
+        """Async version of stream_turn"""
+        try:
+            with self.metrics.span("turn", mode="stream"):
+                await self.await_state()
+
+                started = time.perf_counter()
+                story_inputs = self._prepare_turn(user_input)
+                chunks = []
+                try:
+                    with self.metrics.span("chain", chain="story"):
+                        async for chunk in self.chains.story_chain.astream(story_inputs,
+                                                                           config=self._run_config("story")):
+                            chunks.append(chunk)
+                            yield chunk
+                except BaseException:
+                    if self._settle_turn("".join(chunks)):
+                        self._astart_state_extraction()
+                    raise
+                story_text = "".join(chunks)
+                self._record_timing("story", time.perf_counter() - started)
+
+                self._complete_turn(story_text)
+                self._astart_state_extraction()
+
+        except Exception as e:
+            logging.error(f"Error streaming turn: {str(e)}", exc_info=True)
+            raise
+
+    def close(self) -> None:
+        """Wait for pending background work, releasing the chains if they are private"""
+        self.wait_for_state()
+        if self.summary_memory is not None:
+            try:
+                self.summary_memory.wait()
+            except Exception as e:
+                logging.error(f"Story summary update failed: {str(e)}")
+        if self.journal is not None:
+            self.journal.close()
+        if self._owns_chains:
+            self.chains.close()
+
+    def get_metrics(self) -> dict:
+        """Get the process-wide latency histograms (p50/p95/p99) and counters"""
+        return self.metrics.snapshot()
+
+    @property
+    def total_input_tokens(self) -> int:
+        return self.ledger.totals()["input_tokens"]
+
+    @property
+    def total_output_tokens(self) -> int:
+        return self.ledger.totals()["output_tokens"]
+
     def get_token_stats(self) -> dict:
-        """Get token usage statistics"""
-        costs = self.config.get_token_costs()
-        input_cost = (self.total_input_tokens / 1000) * costs["input"]
-        output_cost = (self.total_output_tokens / 1000) * costs["output"]
-        
-        return {
-            "input_tokens": self.total_input_tokens,
-            "output_tokens": self.total_output_tokens,
-            "total_tokens": self.total_input_tokens + self.total_output_tokens,
-            "estimated_cost": round(input_cost + output_cost, 4)
-        }
+        """Get token usage and cost for the session, with a per-chain breakdown"""
+        stats = self.ledger.totals()
+        stats["estimated_cost"] = round(stats["estimated_cost"], 4)
+        stats["by_chain"] = self.ledger.by_chain()
+        return stats
+
+    def get_turn_token_stats(self) -> dict:
+        """Get token usage and cost per turn (0 is the option menu)"""
+        return self.ledger.by_turn()
 
     async def run_game_loop(self):
         """Main game loop (Terminal version)"""
         try:
-            # Initialize game
-            game_init = self.initialize_game()
-            print(game_init["options"])
+            # Offer the character and setting options (once per game)
+            print(await self.aoffer_options())
             
             # Get character selection
-            character_selection = input("Choose your character and setting: ")
-            game_init = self.initialize_game(character_selection)
+            character_selection = await ainput("Choose your character and setting: ")
             print("\nStarting adventure...\n")
-            print(game_init["initial_story"])
+            print(await self.astart_story(character_selection))
             
             while True:
                 # Get player input
-                user_input = input("\nWhat would you like to do? (or type 'quit' to end): ")
+                user_input = await ainput("\nWhat would you like to do? (or type 'quit' to end): ")
                 
                 if user_input.lower() == 'quit':
                     print("\nThanks for playing!")
+                    await self.await_state()
+                    self.close()
 
                     # save the messages to a file
                     with open("messages.json", "w") as f:
-                        json.dump([{"content": message.content} for message in self.messages], f)
+                        json.dump([{"role": message.type, "content": message.content}
+                                   for message in self.messages], f)
                     break
                 
-                # Process turn and display result
-                story_text = self.process_turn(user_input)
-                print("\n" + story_text)
+                # Process turn and print the narration as it streams in
+                print()
+                async for chunk in self.astream_turn(user_input):
+                    print(chunk, end="", flush=True)
+                print()
                 
         except Exception as e:
             print(f"An error occurred: {e}")
-            logging.error(f"Error in game loop: {str(e)}", exc_info=True)
\ No newline at end of file
+            logging.error(f"Error in game loop: {str(e)}", exc_info=True)
@@ -0,0 +1,68 @@
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class GameState(BaseModel):
+    """Structured state of the adventure"""
+    model_config = ConfigDict(frozen=True)
+
+    character: Optional[str] = None
+    setting: Optional[str] = None
+    location: Optional[str] = None
+    status: Optional[str] = None
+    inventory: List[str] = Field(default_factory=list)
+    companions: List[str] = Field(default_factory=list)
+    objectives: List[str] = Field(default_factory=list)
+
+    def apply(self, update: "GameStateUpdate") -> "GameState":
+        """Return a new state with the changes from an update applied"""
+        def merge(current: List[str], added: List[str], removed: List[str]) -> List[str]:
+            removed_keys = {item.casefold() for item in removed}
+            merged = [item for item in current if item.casefold() not in removed_keys]
+            known = {item.casefold() for item in merged}
+            for item in added:
+                if item.casefold() not in known and item.casefold() not in removed_keys:
+                    merged.append(item)
+                    known.add(item.casefold())
+            return merged
+
+        return GameState(
+            character=update.character or self.character,
+            setting=update.setting or self.setting,
+            location=update.location or self.location,
+            status=update.status or self.status,
+            inventory=merge(self.inventory, update.items_gained, update.items_lost),
+            companions=merge(self.companions, update.companions_joined, update.companions_left),
+            objectives=merge(self.objectives, update.objectives_added, update.objectives_completed)
+        )
+
+    def render(self) -> str:
+        """Render the state compactly for the story prompt"""
+        lines = [
+            f"{label}: {value}"
+            for label, value in (
+                ("Character", self.character),
+                ("Setting", self.setting),
+                ("Location", self.location),
+                ("Status", self.status),
+                ("Inventory", ", ".join(self.inventory)),
+                ("Companions", ", ".join(self.companions)),
+                ("Objectives", "; ".join(self.objectives))
+            )
+            if value
+        ]
+        return "\n".join(lines) or "Unknown"
+
+
+class GameStateUpdate(BaseModel):
+    """Changes to the game state caused by the latest turn"""
+    character: Optional[str] = Field(None, description="The character's name, only if it is new or changed")
+    setting: Optional[str] = Field(None, description="The setting's name, only if it is new or changed")
+    location: Optional[str] = Field(None, description="The current location's name, only if it changed")
+    status: Optional[str] = Field(None, description="The character's status (health, condition, mood), only if it changed")
+    items_gained: List[str] = Field(default_factory=list, description="Items the character acquired this turn")
+    items_lost: List[str] = Field(default_factory=list, description="Items the character used up, lost or gave away this turn")
+    companions_joined: List[str] = Field(default_factory=list, description="Characters who joined the party this turn")
+    companions_left: List[str] = Field(default_factory=list, description="Characters who left the party this turn")
+    objectives_added: List[str] = Field(default_factory=list, description="New goals or quests this turn")
+    objectives_completed: List[str] = Field(default_factory=list, description="Goals or quests completed or abandoned this turn")
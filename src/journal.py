@@ -0,0 +1,289 @@
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+import json
+import logging
+import os
+import threading
+import time
+
+JOURNAL_VERSION = 1
+
+FSYNC_POLICIES = ("always", "checkpoint", "never")
+
+_MESSAGE_TYPES = {"system": SystemMessage, "human": HumanMessage, "ai": AIMessage}
+
+# Checkpoint lines start with this, so the loader can find the last one by
+# scanning the end of the file
+_CHECKPOINT_PREFIX = b'{"t":"checkpoint"'
+_SCAN_BLOCK = 64 * 1024
+
+
+def encode_messages(messages: List[BaseMessage]) -> List[List[str]]:
+    """Encode messages as compact [role, content] pairs"""
+    return [[message.type, message.content] for message in messages]
+
+
+def decode_messages(pairs: List[List[str]]) -> List[BaseMessage]:
+    """Rebuild messages from [role, content] pairs"""
+    return [_MESSAGE_TYPES[role](content=content) for role, content in pairs]
+
+
+class SessionJournal:
+    """Append-only JSON-lines journal of one game session.
+
+    Record types (``t``):
+
+    - ``start``: a new game; the system, setup and option menu messages
+    - ``turn``: the messages added during a turn, the number of old
+      messages trimmed from the history window, the latest game state,
+      and the turn's token usage and timings
+    - ``state``: a game state extracted in the background
+    - ``summary``: an updated story summary and how many trimmed messages
+      it has folded in since the game started; a summary update runs in the
+      background, so its record may come before the turn that trimmed them
+    - ``checkpoint``: the whole resumable engine state, written every
+      ``checkpoint_every`` turns so resuming never replays more than that
+
+    Every record is flushed to the OS when written, so a crashed process
+    loses nothing; ``fsync`` controls when records are also forced to disk:
+    after every record (``always``), at checkpoints (``checkpoint``) or
+    never (``never``).
+    """
+
+    def __init__(self, path: str, fsync: str = "checkpoint", checkpoint_every: int = 20):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported fsync policy: {fsync}. Supported policies: {', '.join(FSYNC_POLICIES)}")
+        self.path = path
+        self.fsync = fsync
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        _truncate_torn_tail(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, record: Dict[str, Any], sync: bool = False) -> None:
+        """Write one record; ``t`` must be the first key"""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line)
+                self._file.flush()
+                if self.fsync == "always" or (sync and self.fsync == "checkpoint"):
+                    os.fsync(self._file.fileno())
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not write session journal {self.path}: {str(e)}")
+
+    def write_start(self, messages: List[BaseMessage], turn: int = 0, state_turn: int = 0) -> None:
+        self.append({"t": "start", "v": JOURNAL_VERSION, "turn": turn, "ts": round(time.time(), 3),
+                     "messages": encode_messages(messages), "state_turn": state_turn})
+
+    def write_turn(self,
+                   turn: int,
+                   messages: List[BaseMessage],
+                   dropped: int,
+                   state: Optional[Dict[str, Any]],
+                   state_turn: int,
+                   tokens: Optional[Dict[str, Any]] = None,
+                   timings: Optional[Dict[str, float]] = None) -> None:
+        self.append({
+            "t": "turn",
+            "turn": turn,
+            "ts": round(time.time(), 3),
+            "messages": encode_messages(messages),
+            "dropped": dropped,
+            "state": state,
+            "state_turn": state_turn,
+            "tokens": tokens or {},
+            "timings": {phase: round(seconds, 4) for phase, seconds in (timings or {}).items()}
+        })
+
+    def write_state(self, turn: int, state: Dict[str, Any]) -> None:
+        self.append({"t": "state", "turn": turn, "state": state})
+
+    def write_summary(self, summary: str, folded: int) -> None:
+        self.append({"t": "summary", "text": summary, "folded": folded})
+
+    def write_checkpoint(self,
+                         turn: int,
+                         messages: List[BaseMessage],
+                         state: Optional[Dict[str, Any]],
+                         state_turn: int,
+                         summary: str,
+                         folded: int,
+                         backlog: List[BaseMessage]) -> None:
+        self.append({
+            "t": "checkpoint",
+            "v": JOURNAL_VERSION,
+            "turn": turn,
+            "ts": round(time.time(), 3),
+            "messages": encode_messages(messages),
+            "state": state,
+            "state_turn": state_turn,
+            "summary": summary,
+            "folded": folded,
+            "backlog": encode_messages(backlog)
+        }, sync=True)
+
+    def checkpoint_due(self, turn: int) -> bool:
+        return self.checkpoint_every > 0 and turn % self.checkpoint_every == 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.flush()
+                if self.fsync != "never":
+                    os.fsync(self._file.fileno())
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not flush session journal {self.path}: {str(e)}")
+            self._file.close()
+            self._file = None
+
+
+class JournalSnapshot:
+    """Engine state rebuilt from a journal"""
+
+    def __init__(self, pinned: int):
+        self.pinned = pinned
+        self.messages: List[BaseMessage] = []
+        self.state: Optional[Dict[str, Any]] = None
+        self.state_turn = 0
+        self.turn = 0
+        self.summary = ""
+        # Messages trimmed from the history and folded into the summary since the game started
+        self.trimmed = 0
+        self.folded = 0
+        # Trimmed messages not yet folded into the summary
+        self.backlog: List[BaseMessage] = []
+        self.records = 0
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        """Replay one journal record"""
+        kind = record.get("t")
+        self.records += 1
+        if kind in ("start", "checkpoint"):
+            self.messages = decode_messages(record["messages"])
+            self.state = record.get("state")
+            self.state_turn = record.get("state_turn", 0)
+            self.turn = record.get("turn", 0)
+            self.summary = record.get("summary", "")
+            self.backlog = decode_messages(record.get("backlog", []))
+            self.folded = record.get("folded", 0)
+            self.trimmed = self.folded + len(self.backlog)
+        elif kind == "turn":
+            self.messages.extend(decode_messages(record["messages"]))
+            dropped = record.get("dropped", 0)
+            if dropped:
+                # Same window as GameEngine._trim_history: the system message and pinned messages stay
+                keep = 1 + self.pinned
+                self.backlog.extend(self.messages[keep:keep + dropped])
+                self.messages = self.messages[:keep] + self.messages[keep + dropped:]
+                self.trimmed += dropped
+                self._prune_backlog()
+            self.turn = record["turn"]
+            self._set_state(record.get("state_turn", 0), record.get("state"))
+        elif kind == "state":
+            self._set_state(record["turn"], record["state"])
+        elif kind == "summary":
+            self.summary = record["text"]
+            self.folded = max(self.folded, record.get("folded", 0))
+            self._prune_backlog()
+
+    def _prune_backlog(self) -> None:
+        """Drop backlog messages the summary already folded in"""
+        folded_from_backlog = self.folded - (self.trimmed - len(self.backlog))
+        if folded_from_backlog > 0:
+            self.backlog = self.backlog[folded_from_backlog:]
+
+    def _set_state(self, turn: int, state: Optional[Dict[str, Any]]) -> None:
+        if state is not None and turn > self.state_turn:
+            self.state = state
+            self.state_turn = turn
+
+
+def _truncate_torn_tail(path: str) -> None:
+    """Cut a partially written last record, so new records start on a fresh line"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            size = min(_SCAN_BLOCK, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            index = block.rfind(b"\n")
+            if index >= 0:
+                position += index + 1
+                break
+        if position < end:
+            logging.warning(f"Dropping incomplete last record in {path}")
+            f.truncate(position)
+
+
+def iter_records(path: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """Stream records from a byte offset, skipping a torn final line"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Partially written when the process died
+                logging.warning(f"Ignoring incomplete last record in {path}")
+                return
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable record in {path}")
+
+
+def find_last_checkpoint(path: str) -> int:
+    """Byte offset of the last checkpoint record, or 0 if there is none.
+
+    Scans backwards from the end of the file, so the cost depends on the
+    distance to the last checkpoint rather than the session length.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        carry = b""
+        while position > 0:
+            size = min(_SCAN_BLOCK, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size) + carry
+            index = block.rfind(b"\n" + _CHECKPOINT_PREFIX)
+            if index >= 0:
+                return position + index + 1
+            if position == 0 and block.startswith(_CHECKPOINT_PREFIX):
+                return 0
+            # Keep enough of this block to match a record split across blocks
+            carry = block[:len(_CHECKPOINT_PREFIX) + 1]
+    return 0
+
+
+def load_journal(path: str, pinned: int, from_checkpoint: bool = True) -> JournalSnapshot:
+    """Rebuild the engine state recorded in a journal.
+
+    Args:
+        path: Journal file
+        pinned: Messages after the system message that are never trimmed
+        from_checkpoint: Start from the last checkpoint instead of replaying
+            the whole journal
+
+    Returns:
+        The rebuilt state
+    """
+    if not os.path.exists(path):
+        raise ValueError(f"No session journal at {path}")
+    snapshot = JournalSnapshot(pinned)
+    offset = find_last_checkpoint(path) if from_checkpoint else 0
+    for record in iter_records(path, offset):
+        snapshot.apply(record)
+    if not snapshot.messages:
+        raise ValueError(f"Session journal {path} has no game to resume")
+    return snapshot
@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import List
+from langchain_core.messages import BaseMessage
+import json
+import logging
+import os
+import threading
+from .journal import decode_messages, encode_messages
+
+
+class MessageArchive:
+    """Append-only archive of the messages shown to one player.
+
+    Messages are stored as JSON lines in ``path`` and read back a page at a
+    time: the byte offset of every line is indexed when the archive is
+    opened, so loading an old page seeks straight to it instead of reading
+    the whole session. Pages are aligned to multiples of ``page_size``, so
+    every page but the last never changes once written.
+    """
+
+    def __init__(self, path: str, page_size: int = 20):
+        if page_size < 1:
+            raise ValueError(f"page_size must be positive, got {page_size}")
+        self.path = path
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        # Byte offset of each message's line, plus the end of the last one
+        self._offsets: List[int] = [0]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._index()
+
+    def _index(self) -> None:
+        """Index the lines already in the archive, cutting a torn last line"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            position = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    logging.warning(f"Dropping incomplete last message in {self.path}")
+                    f.truncate(position)
+                    break
+                position += len(line)
+                self._offsets.append(position)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def page_count(self) -> int:
+        return -(-len(self) // self.page_size)
+
+    def append(self, message: BaseMessage) -> int:
+        """Archive a message; returns its index"""
+        line = (json.dumps(encode_messages([message])[0], ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+            return len(self._offsets) - 2
+
+    def read(self, start: int, stop: int) -> List[BaseMessage]:
+        """Messages ``start`` up to (not including) ``stop``"""
+        with self._lock:
+            start = max(0, min(start, len(self)))
+            stop = max(start, min(stop, len(self)))
+            if start == stop:
+                return []
+            with open(self.path, "rb") as f:
+                f.seek(self._offsets[start])
+                data = f.read(self._offsets[stop] - self._offsets[start])
+        return decode_messages([json.loads(line) for line in data.splitlines()])
+
+    def page(self, number: int) -> List[BaseMessage]:
+        """Messages on page ``number``, counting from 0 at the start of the session"""
+        return self.read(number * self.page_size, (number + 1) * self.page_size)
+
+    def first_visible_page(self, older_pages: int = 0) -> int:
+        """First page to draw so at least one page of the latest messages is visible.
+
+        Args:
+            older_pages: Extra pages to load before that, e.g. as the player scrolls back
+        """
+        latest = max(len(self) - self.page_size, 0) // self.page_size
+        return max(latest - older_pages, 0)
+
+    def clear(self) -> None:
+        """Empty the archive for a new game"""
+        with self._lock:
+            open(self.path, "wb").close()
+            self._offsets = [0]
@@ -0,0 +1,311 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+import json
+import logging
+import threading
+import time
+import uuid
+
+# Latency buckets in seconds, from template lookups to slow completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Latency histogram with Prometheus buckets and recent-sample percentiles"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, reservoir: int = 4096):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        # Percentiles are computed over the most recent samples
+        self._samples: Deque[float] = deque(maxlen=reservoir)
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self._samples.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self._samples)
+
+        def pick(pct: float) -> float:
+            return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)] if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "p50": round(pick(50), 6),
+            "p95": round(pick(95), 6),
+            "p99": round(pick(99), 6)
+        }
+
+
+class Span:
+    """A timed phase of a turn"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "labels", "attributes", "start", "duration")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], labels: Dict[str, str]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.labels = labels
+        self.attributes: Dict[str, Any] = {}
+        self.start = time.time()
+        self.duration = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1e3, 3),
+            **self.labels,
+            **self.attributes
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost active span in this context"""
+    return _current_span.get()
+
+
+class MetricsRegistry:
+    """In-process metrics: latency histograms, counters and a JSON-lines trace.
+
+    Spans nest through a context variable, so a span opened inside another
+    joins its trace; work handed to a thread pool keeps its trace when it is
+    submitted with ``contextvars.copy_context().run``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._trace_file = None
+        self._trace_path: Optional[str] = None
+        self.callback_handler = MetricsCallbackHandler(self)
+
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the help text shown in the Prometheus export"""
+        self._help[name] = help_text
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """Add a sample to a histogram"""
+        key = self._label_key(labels)
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            histogram = family.get(key)
+            if histogram is None:
+                histogram = family[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, amount: float = 1.0, **labels: Any) -> None:
+        """Add to a counter"""
+        key = self._label_key(labels)
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0.0) + amount
+
+    @contextmanager
+    def span(self, name: str, **labels: Any) -> Iterator[Span]:
+        """Time a phase, recording it in ``game_span_seconds`` and the trace.
+
+        A span opened outside any other span starts a new trace.
+        """
+        parent = _current_span.get()
+        span = Span(name,
+                    parent.trace_id if parent is not None else uuid.uuid4().hex,
+                    parent.span_id if parent is not None else None,
+                    {key: str(value) for key, value in labels.items()})
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            self.observe("game_span_seconds", span.duration, span=name, **labels)
+            self._write_trace(span)
+
+    def enable_tracing(self, path: str) -> None:
+        """Append finished spans to a JSON-lines file"""
+        with self._lock:
+            if self._trace_path == path:
+                return
+            if self._trace_file is not None:
+                self._trace_file.close()
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._trace_file = open(path, "a", encoding="utf-8", buffering=1)
+            self._trace_path = path
+
+    def _write_trace(self, span: Span) -> None:
+        if self._trace_file is None:
+            return
+        line = json.dumps(span.to_dict())
+        with self._lock:
+            try:
+                self._trace_file.write(line + "\n")
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not write trace span: {str(e)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all histograms (count, sum, p50/p95/p99 in seconds) and counters"""
+        with self._lock:
+            return {
+                "histograms": {
+                    name: {self._format_labels(key): histogram.summary() for key, histogram in family.items()}
+                    for name, family in self._histograms.items()
+                },
+                "counters": {
+                    name: {self._format_labels(key): value for key, value in family.items()}
+                    for name, family in self._counters.items()
+                }
+            }
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, family in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in family.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.bucket_counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {histogram.total}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {histogram.count}")
+            for name, family in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in family.items():
+                    lines.append(f"{name}{self._format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drop all recorded metrics"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records per-call LLM latency, time to first token, errors and retries.
+
+    The chain name comes from the run metadata (``{"chain": "story"}``). A
+    call that follows a failed call for the same chain and trace is counted
+    as a retry.
+    """
+
+    # Run in the caller's context so spans and timings stay accurate
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        # run_id -> (chain, retry key, start time, first token seen)
+        self._runs: Dict[UUID, List[Any]] = {}
+        self._failed: Dict[Tuple[str, Optional[str]], float] = {}
+
+    def _start(self, run_id: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        chain = (metadata or {}).get("chain", "unknown")
+        span = current_span()
+        retry_key = (chain, span.trace_id if span is not None else None)
+        with self._lock:
+            retried = self._failed.pop(retry_key, None) is not None
+            # Forget failures that were never retried
+            if len(self._failed) > 1000:
+                self._failed.clear()
+            self._runs[run_id] = [chain, retry_key, time.perf_counter(), False]
+        if retried:
+            self.registry.increment("game_llm_retries_total", chain=chain)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is None or run[3]:
+            return
+        run[3] = True
+        ttft = time.perf_counter() - run[2]
+        self.registry.observe("game_time_to_first_token_seconds", ttft, chain=run[0])
+        span = current_span()
+        if span is not None:
+            span.attributes["ttft_ms"] = round(ttft * 1e3, 3)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        duration = time.perf_counter() - run[2]
+        self.registry.observe("game_llm_seconds", duration, chain=run[0])
+        if not run[3]:
+            # Not streamed: the whole reply arrived at once
+            self.registry.observe("game_time_to_first_token_seconds", duration, chain=run[0])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is not None:
+                self._failed[run[1]] = time.time()
+        chain = run[0] if run is not None else "unknown"
+        self.registry.increment("game_llm_errors_total", chain=chain, error=type(error).__name__)
+
+    def on_retry(self, retry_state, *, run_id: UUID, **kwargs: Any) -> None:
+        self.registry.increment("game_llm_retries_total", chain="unknown")
+
+
+_registry = MetricsRegistry()
+_registry.describe("game_span_seconds", "Duration of engine phases (template load, history formatting, chain calls)")
+_registry.describe("game_llm_seconds", "Duration of provider calls")
+_registry.describe("game_time_to_first_token_seconds", "Time until the first narration token")
+_registry.describe("game_llm_errors_total", "Failed provider calls")
+_registry.describe("game_llm_retries_total", "Provider calls retried after a failure")
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get the process-wide metrics registry"""
+    return _registry
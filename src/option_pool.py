@@ -0,0 +1,157 @@
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+class OptionPool:
+    """Pool of pre-generated character/setting option menus.
+
+    Menus are persisted to a JSON file so they survive restarts, served in
+    rotation (each menu at most ``max_uses`` times) and refilled by a
+    background thread whenever the pool drops below ``size``. Refills run
+    with the runnable config of the draw that started them, so their calls
+    reach that session's usage and metrics callbacks.
+    """
+
+    def __init__(self,
+                 generate: Callable[[Optional[dict]], str],
+                 path: str,
+                 size: int = 8,
+                 max_uses: int = 3):
+        self.generate = generate
+        self.path = Path(path)
+        self.size = size
+        self.max_uses = max_uses
+        self._lock = threading.Lock()
+        self._menus: Deque[dict] = deque()
+        self._refill_thread: Optional[threading.Thread] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._menus)
+
+    def _load(self) -> None:
+        """Load persisted menus"""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._menus = deque(menu for menu in data.get("menus", []) if menu.get("uses", 0) < self.max_uses)
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            logging.warning(f"Ignoring unreadable option pool {self.path}: {str(e)}")
+
+    def _save(self) -> None:
+        """Persist the menus (caller holds the lock)"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"menus": list(self._menus)}), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save option pool {self.path}: {str(e)}")
+
+    def draw(self, config: Optional[dict] = None) -> Optional[str]:
+        """Take the next menu in rotation.
+
+        Args:
+            config: Runnable config (callbacks, metadata) for a refill this draw starts
+
+        Returns:
+            A menu, or None if the pool is empty
+        """
+        with self._lock:
+            if not self._menus:
+                menu = None
+            else:
+                entry = self._menus.popleft()
+                entry["uses"] = entry.get("uses", 0) + 1
+                if entry["uses"] < self.max_uses:
+                    self._menus.append(entry)
+                menu = entry["text"]
+                self._save()
+        self.refill(config)
+        return menu
+
+    def add(self, text: str, uses: int = 0) -> None:
+        """Add a menu that was generated outside the pool"""
+        if uses >= self.max_uses:
+            return
+        with self._lock:
+            self._menus.append({"text": text, "uses": uses})
+            self._save()
+
+    def refill(self, config: Optional[dict] = None) -> None:
+        """Top the pool up to ``size`` in a background thread"""
+        with self._lock:
+            if len(self._menus) >= self.size:
+                return
+            if self._refill_thread is not None and self._refill_thread.is_alive():
+                return
+            self._refill_thread = threading.Thread(target=self._refill, args=(config,),
+                                                   name="option-pool-refill", daemon=True)
+            self._refill_thread.start()
+
+    def _refill(self, config: Optional[dict]) -> None:
+        """Generate menus until the pool is full"""
+        while True:
+            with self._lock:
+                if len(self._menus) >= self.size:
+                    return
+            try:
+                text = self.generate(config)
+            except Exception as e:
+                logging.error(f"Failed to generate option menu: {str(e)}")
+                return
+            self.add(text)
+
+
+_pools: Dict[str, OptionPool] = {}
+# ChainSets using each pool
+_pool_users: Dict[str, int] = {}
+_pools_lock = threading.Lock()
+
+
+def get_option_pool(fingerprint_parts: tuple,
+                    generate: Callable[[Optional[dict]], str],
+                    directory: str,
+                    size: int = 8,
+                    max_uses: int = 3) -> OptionPool:
+    """Get the process-wide pool for a model, account and prompt combination.
+
+    Args:
+        fingerprint_parts: Values that determine the menus and who pays for them
+            (model name, account, prompt texts); a change in any of them starts a new pool
+        generate: Produces a fresh menu when the pool needs refilling; takes
+            the runnable config of the draw that started the refill
+        directory: Where pools are persisted
+        size: Number of menus to keep ready
+        max_uses: How many games each menu is served to
+
+    Returns:
+        The shared OptionPool; hand it back with release_option_pool when done
+    """
+    fingerprint = hashlib.sha256("\x00".join(map(str, fingerprint_parts)).encode("utf-8")).hexdigest()[:16]
+    with _pools_lock:
+        pool = _pools.get(fingerprint)
+        if pool is None:
+            pool = OptionPool(generate, os.path.join(directory, f"{fingerprint}.json"), size, max_uses)
+            _pools[fingerprint] = pool
+        _pool_users[fingerprint] = _pool_users.get(fingerprint, 0) + 1
+        return pool
+
+
+def release_option_pool(pool: OptionPool) -> None:
+    """Drop a use of a shared pool; the last one removes it from the process (its menus stay on disk)"""
+    with _pools_lock:
+        fingerprint = next((key for key, shared in _pools.items() if shared is pool), None)
+        if fingerprint is None:
+            return
+        _pool_users[fingerprint] -= 1
+        if _pool_users[fingerprint] <= 0:
+            del _pools[fingerprint]
+            del _pool_users[fingerprint]
@@ -0,0 +1,244 @@
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from .config import ChatConfig
+from .chains import ChainSet
+from .game_engine import GameEngine
+
+
+def _canonical(value: Any) -> Any:
+    """A representation of a config value that does not depend on dict order"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, dict):
+        return sorted((str(_canonical(key)), _canonical(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(item) for item in value)
+    return value
+
+
+class SessionManager:
+    """Hosts many concurrent games on a small number of shared ChainSets.
+
+    Sessions with the same provider, model, credentials and prompt settings
+    share one provider client and one set of compiled chains; each session
+    only owns its GameEngine (conversation and game state). Idle sessions
+    are closed after ``idle_timeout`` seconds and the least recently used
+    session is evicted once ``max_sessions`` is reached. A ChainSet is
+    closed when the last session using it ends, so memory stays bounded by
+    the live sessions rather than by every key seen since startup.
+    """
+
+    def __init__(self, max_sessions: int = 200, idle_timeout: Optional[float] = 1800.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._chain_sets: Dict[str, ChainSet] = {}
+        # Live sessions using each ChainSet
+        self._chain_users: Dict[str, int] = {}
+        # session_id -> (engine, last access time), least recently used first
+        self._sessions: "OrderedDict[str, Tuple[GameEngine, float]]" = OrderedDict()
+
+    @staticmethod
+    def _chain_key(config: ChatConfig) -> str:
+        """Fingerprint the settings that determine a ChainSet.
+
+        Built from ``ChatConfig.chain_settings``, so settings added to the
+        config take part unless they are declared per-session. Credentials
+        are resolved for every provider used and only their hash is kept.
+        """
+        parts = [f"{name}={_canonical(value)!r}" for name, value in config.chain_settings().items()]
+        for provider in (config.provider, *config.fallback_providers):
+            parts.append(f"{provider.value}:{config.get_account_id(provider)}")
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    def _acquire_chain_set(self, config: ChatConfig) -> ChainSet:
+        """Get the shared ChainSet for a configuration for a new session, creating it on first use"""
+        key = self._chain_key(config)
+        with self._lock:
+            chains = self._chain_sets.get(key)
+            if chains is None:
+                chains = ChainSet(config)
+                self._chain_sets[key] = chains
+            self._chain_users[key] = self._chain_users.get(key, 0) + 1
+        # Pick up prompt edits made while the app is running
+        chains.refresh()
+        return chains
+
+    def _release_chain_set(self, chains: ChainSet) -> None:
+        """Drop a session's use of a ChainSet, closing it once no session uses it"""
+        with self._lock:
+            key = next((key for key, shared in self._chain_sets.items() if shared is chains), None)
+            if key is None:
+                return
+            self._chain_users[key] -= 1
+            if self._chain_users[key] > 0:
+                return
+            del self._chain_sets[key]
+            del self._chain_users[key]
+        chains.close()
+
+    def create_session(self, config: ChatConfig, session_id: Optional[str] = None) -> Tuple[str, GameEngine]:
+        """Start a new game session.
+
+        Args:
+            config: Chat configuration for the game
+            session_id: Id to use; a random one is generated if not given.
+                An existing session with the same id is replaced.
+
+        Returns:
+            The session id and its GameEngine
+        """
+        session_id = session_id or uuid.uuid4().hex
+        chains = self._acquire_chain_set(config)
+        try:
+            engine = GameEngine(config, chains=chains, session_id=session_id)
+        except Exception:
+            self._release_chain_set(chains)
+            raise
+        self._register(session_id, engine)
+        return session_id, engine
+
+    def resume_session(self, config: ChatConfig, session_id: str) -> GameEngine:
+        """Resume a session from its journal, e.g. after a restart or once it expired.
+
+        Args:
+            config: Chat configuration with ``journal_dir`` set
+            session_id: Session to resume
+
+        Returns:
+            The resumed GameEngine, registered under ``session_id``
+
+        Raises:
+            ValueError: If journaling is disabled or the session has no journal
+        """
+        chains = self._acquire_chain_set(config)
+        try:
+            engine = GameEngine.from_journal(config, session_id, chains=chains)
+        except Exception:
+            self._release_chain_set(chains)
+            raise
+        self._register(session_id, engine)
+        return engine
+
+    def _register(self, session_id: str, engine: GameEngine) -> None:
+        evicted = self._expired_sessions()
+        with self._lock:
+            replaced = self._sessions.pop(session_id, None)
+            if replaced is not None:
+                evicted.append(replaced[0])
+            while len(self._sessions) >= self.max_sessions:
+                _, (oldest, _) = self._sessions.popitem(last=False)
+                evicted.append(oldest)
+            self._sessions[session_id] = (engine, time.monotonic())
+
+        self._close_engines(evicted)
+
+    def get_session(self, session_id: str) -> Optional[GameEngine]:
+        """Get a session's engine, or None if it does not exist or has expired"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            engine, last_access = entry
+            if self._is_idle(last_access, time.monotonic()):
+                del self._sessions[session_id]
+                expired = engine
+            else:
+                self._sessions[session_id] = (engine, time.monotonic())
+                self._sessions.move_to_end(session_id)
+                return engine
+        self._close_engines([expired])
+        return None
+
+    def close_session(self, session_id: str) -> bool:
+        """End a session.
+
+        Returns:
+            True if the session existed
+        """
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        self._close_engines([entry[0]])
+        return True
+
+    def evict_idle(self) -> int:
+        """Close sessions that have been idle longer than ``idle_timeout``.
+
+        Returns:
+            Number of sessions closed
+        """
+        expired = self._expired_sessions()
+        self._close_engines(expired)
+        return len(expired)
+
+    def _is_idle(self, last_access: float, now: float) -> bool:
+        return self.idle_timeout is not None and now - last_access > self.idle_timeout
+
+    def _expired_sessions(self) -> List[GameEngine]:
+        """Remove idle sessions and return their engines"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            # Sessions are kept in access order, so idle ones are at the front
+            while self._sessions:
+                session_id, (engine, last_access) = next(iter(self._sessions.items()))
+                if not self._is_idle(last_access, now):
+                    break
+                del self._sessions[session_id]
+                expired.append(engine)
+        return expired
+
+    def _close_engines(self, engines: List[GameEngine]) -> None:
+        """Close engines outside the lock; closing waits for background work"""
+        for engine in engines:
+            try:
+                engine.close()
+            except Exception as e:
+                logging.error(f"Error closing game session: {str(e)}")
+            self._release_chain_set(engine.chains)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        """Get session and shared chain counts"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "chain_sets": len(self._chain_sets),
+                "max_sessions": self.max_sessions
+            }
+
+    def close(self) -> None:
+        """Close every session and release the shared chains"""
+        with self._lock:
+            engines = [engine for engine, _ in self._sessions.values()]
+            chain_sets = list(self._chain_sets.values())
+            self._sessions.clear()
+            self._chain_sets.clear()
+            self._chain_users.clear()
+        # The ChainSets were unregistered above, so each is closed once, below
+        self._close_engines(engines)
+        for chains in chain_sets:
+            chains.close()
+
+
+_manager: Optional[SessionManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager() -> SessionManager:
+    """Get the process-wide session manager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager()
+        return _manager
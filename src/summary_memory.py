@@ -0,0 +1,118 @@
+from concurrent.futures import Executor, Future
+from typing import Callable, List, Optional, Tuple
+from langchain_core.messages import BaseMessage
+import logging
+import threading
+from .transcript import Transcript
+
+# Placeholder used in prompts before anything has been summarized
+EMPTY_SUMMARY = "Nothing has happened yet."
+
+
+class SummaryMemory:
+    """Rolling "story so far" summary of the turns that left the context window.
+
+    Dropped messages are queued and folded into the summary by a background
+    job. Only one job runs at a time and each one takes everything queued so
+    far, so updates are applied in order and never block a turn. A reset
+    starts a new generation; an update still running for the previous one
+    (e.g. the last game's) is discarded when it finishes.
+    """
+
+    def __init__(self,
+                 summarize: Callable[[str, str], str],
+                 executor: Executor,
+                 on_update: Optional[Callable[[str, int], None]] = None):
+        """
+        Args:
+            summarize: Takes the current summary and the new turns as text and
+                returns the updated summary
+            executor: Runs the background summary updates
+            on_update: Called with the new summary and the number of messages
+                folded into it since the last reset
+        """
+        self.summarize = summarize
+        self.executor = executor
+        self.on_update = on_update
+        self.summary = ""
+        # Messages folded into the summary since the last reset
+        self.folded = 0
+        self._backlog: List[BaseMessage] = []
+        # Messages being folded by the running update
+        self._folding: List[BaseMessage] = []
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        # Bumped by reset, so updates started before it are not applied
+        self._generation = 0
+
+    @property
+    def text(self) -> str:
+        """The summary for use in prompts"""
+        return self.summary or EMPTY_SUMMARY
+
+    @property
+    def is_updating(self) -> bool:
+        """Whether a summary update is queued or running"""
+        return self._pending is not None and not self._pending.done()
+
+    def fold(self, messages: List[BaseMessage]) -> None:
+        """Queue messages that left the history to be folded into the summary"""
+        if not messages:
+            return
+        with self._lock:
+            self._backlog.extend(messages)
+            if self.is_updating:
+                return
+            self._pending = self.executor.submit(self._update)
+
+    def _update(self) -> None:
+        """Fold the queued messages into the summary until the queue is empty"""
+        while True:
+            with self._lock:
+                batch, self._backlog = self._backlog, []
+                self._folding = batch
+                generation = self._generation
+                current = self.text
+            if not batch:
+                return
+            turns = "\n".join(Transcript.render(message) for message in batch)
+            try:
+                summary = self.summarize(current, turns)
+            except Exception as e:
+                logging.error(f"Failed to update story summary: {str(e)}")
+                with self._lock:
+                    if generation == self._generation:
+                        # Keep the turns for the next attempt
+                        self._backlog = batch + self._backlog
+                        self._folding = []
+                return
+            with self._lock:
+                if generation != self._generation:
+                    # Reset while summarizing; the result belongs to the previous game
+                    continue
+                self.summary = summary
+                self.folded += len(batch)
+                folded = self.folded
+                self._folding = []
+            if self.on_update is not None:
+                self.on_update(summary, folded)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until queued summary updates have finished"""
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+    def reset(self, summary: str = "", backlog: Optional[List[BaseMessage]] = None, folded: int = 0) -> None:
+        """Replace the summary, its folded message count and the messages waiting to be folded into it"""
+        with self._lock:
+            self._generation += 1
+            self.summary = summary
+            self.folded = folded
+            self._backlog = list(backlog or [])
+            self._folding = []
+
+    def snapshot(self) -> Tuple[str, int, List[BaseMessage]]:
+        """The summary, the number of messages folded into it and every message not yet folded"""
+        with self._lock:
+            return self.summary, self.folded, self._folding + self._backlog
@@ -0,0 +1,88 @@
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from langchain_core.prompts import ChatPromptTemplate
+import logging
+import os
+import threading
+
+
+class TemplateRegistry:
+    """Process-wide cache of prompt templates.
+
+    Template files are read and parsed once and shared by every engine. Each
+    lookup stats the file and reloads it only when its mtime has changed, so
+    prompt authors can still edit templates while the app is running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts: Dict[str, Tuple[int, str]] = {}
+        self._prompts: Dict[tuple, Tuple[tuple, ChatPromptTemplate]] = {}
+
+    @staticmethod
+    def _mtime(path: str) -> int:
+        """Get the modification time of a template file"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            logging.error(f"Prompt file not found: {path}")
+            raise
+
+    def get_text(self, path: str) -> str:
+        """Get the stripped contents of a template file"""
+        mtime = self._mtime(path)
+        cached = self._texts.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with self._lock:
+            text = Path(path).read_text(encoding="utf-8").strip()
+            self._texts[path] = (mtime, text)
+        logging.debug(f"Loaded prompt template: {path}")
+        return text
+
+    def get_chat_prompt(self,
+                        system_path: str,
+                        human_template: Optional[str] = None,
+                        human_path: Optional[str] = None) -> ChatPromptTemplate:
+        """Get a parsed system + human chat prompt.
+
+        Args:
+            system_path: Template file for the system message
+            human_template: Inline template for the human message
+            human_path: Template file for the human message (used if no inline template)
+
+        Returns:
+            A shared ChatPromptTemplate; callers must not modify it
+        """
+        if human_template is None and human_path is None:
+            raise ValueError("Either human_template or human_path must be provided")
+
+        key = (system_path, human_template, human_path)
+        mtimes = (self._mtime(system_path), self._mtime(human_path) if human_path else None)
+        cached = self._prompts.get(key)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+
+        human = human_template if human_template is not None else self.get_text(human_path)
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", self.get_text(system_path)),
+            ("human", human)
+        ])
+        with self._lock:
+            self._prompts[key] = (mtimes, prompt)
+        return prompt
+
+    def clear(self) -> None:
+        """Drop all cached templates"""
+        with self._lock:
+            self._texts.clear()
+            self._prompts.clear()
+
+
+_registry = TemplateRegistry()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Get the process-wide template registry"""
+    return _registry
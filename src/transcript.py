@@ -0,0 +1,78 @@
+from collections import deque
+from itertools import chain
+from typing import Deque, Iterable, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage
+
+
+class Transcript:
+    """Append-only rendered conversation history.
+
+    Each message is rendered to a ``"User: ..."``/``"Assistant: ..."`` line once,
+    when it is added, so per-turn rendering work is proportional to the new
+    messages only. Lines are kept in a deque for cheap trimming from the front,
+    and the joined text is cached until the transcript changes.
+
+    Producing the text is still linear in its length: ``text`` joins every
+    kept line once per change. That join is a single copy of the text, and any
+    str holding the whole history costs the same to build. A running string
+    that is appended to and sliced would copy it on every change instead.
+
+    The first ``pinned`` messages (character setup and selection) are never
+    dropped and are always part of the rendered text.
+    """
+
+    def __init__(self, pinned: int = 0):
+        self.pinned = pinned
+        self._pinned_lines: List[str] = []
+        self._lines: Deque[str] = deque()
+        self._text: Optional[str] = None
+
+    @staticmethod
+    def render(message: BaseMessage) -> str:
+        """Render a single message as a transcript line"""
+        return f"{'User' if isinstance(message, HumanMessage) else 'Assistant'}: {message.content}"
+
+    def __len__(self) -> int:
+        return len(self._pinned_lines) + len(self._lines)
+
+    @property
+    def text(self) -> str:
+        """The rendered transcript"""
+        if self._text is None:
+            self._text = "\n".join(chain(self._pinned_lines, self._lines))
+        return self._text
+
+    def clear(self) -> None:
+        """Remove all messages"""
+        self._pinned_lines = []
+        self._lines.clear()
+        self._text = None
+
+    def append(self, message: BaseMessage) -> None:
+        """Render and append a message"""
+        line = self.render(message)
+        if len(self._pinned_lines) < self.pinned:
+            self._pinned_lines.append(line)
+        else:
+            self._lines.append(line)
+        self._text = None
+
+    def extend(self, messages: Iterable[BaseMessage]) -> None:
+        """Render and append several messages"""
+        for message in messages:
+            self.append(message)
+
+    def pop(self) -> None:
+        """Remove the newest message"""
+        if self._lines:
+            self._lines.pop()
+        elif self._pinned_lines:
+            self._pinned_lines.pop()
+        self._text = None
+
+    def drop(self, count: int) -> None:
+        """Drop the ``count`` oldest unpinned messages"""
+        for _ in range(min(count, len(self._lines))):
+            self._lines.popleft()
+        if count > 0:
+            self._text = None
@@ -0,0 +1,44 @@
+"""A full game start makes exactly one character call and one story call."""
+import pytest
+
+from src.config import ChatConfig, ChatProvider
+from src.game_engine import GameEngine
+
+
+@pytest.fixture
+def engine():
+    # Offline provider; no option pool or completion cache, so every menu and
+    # narration is a provider call
+    config = ChatConfig(provider=ChatProvider.MOCK, option_pool_size=0, cache_backend=None)
+    engine = GameEngine(config)
+    yield engine
+    engine.close()
+
+
+def provider_calls(engine: GameEngine) -> dict:
+    """Provider calls per chain, as recorded by the token ledger"""
+    return {chain: usage["calls"] for chain, usage in engine.ledger.by_chain().items()}
+
+
+def assert_one_call_each(engine: GameEngine) -> None:
+    engine.wait_for_state()
+    calls = provider_calls(engine)
+    assert calls.get("character") == 1
+    assert calls.get("story") == 1
+
+
+def test_offer_options_then_start_story(engine):
+    options = engine.offer_options()
+    story = engine.start_story("1")
+
+    assert options and story
+    assert_one_call_each(engine)
+
+
+def test_initialize_game_twice(engine):
+    offered = engine.initialize_game()
+    started = engine.initialize_game("1")
+
+    assert offered["options"] == started["options"]
+    assert started["initial_story"]
+    assert_one_call_each(engine)
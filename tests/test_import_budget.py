@@ -0,0 +1,30 @@
+"""Entry points stay within their cold-start import budgets (benchmarks/import_budget.json).
+
+The forbidden-module lists hold on any machine. Time budgets are checked
+with slack, since this runs on machines slower than the one they were set on.
+"""
+import json
+
+import pytest
+
+from benchmarks.import_time import DEFAULT_BUDGET, check, run_target
+
+BUDGETS = json.loads(DEFAULT_BUDGET.read_text(encoding="utf-8"))["targets"]
+
+# Allowed factor over budget_ms
+TIME_SLACK = 2.0
+
+
+@pytest.fixture(scope="module", params=sorted(BUDGETS))
+def target(request):
+    return run_target(request.param, repeat=1), BUDGETS[request.param]
+
+
+def test_no_forbidden_imports(target):
+    result, budget = target
+    assert check(result, {**budget, "budget_ms": float("inf")}) == []
+
+
+def test_import_time_within_budget(target):
+    result, budget = target
+    assert check(result, {"budget_ms": budget["budget_ms"] * TIME_SLACK}) == []
@@ -0,0 +1,25 @@
+"""A cancelled half-open probe must not leave the circuit stuck."""
+import asyncio
+
+from routers.chat_mock import ChatMock
+from routers.resilience import CircuitBreaker, Endpoint, ResilientChatProvider, RetryBudget
+
+
+def test_cancelled_probe_frees_the_circuit():
+    endpoint = Endpoint("mock", CircuitBreaker(failure_threshold=1, reset_timeout=0.0), RetryBudget())
+    provider = ResilientChatProvider(ChatMock(latency=5.0), endpoint=endpoint)
+    endpoint.breaker.record_failure()
+
+    async def cancel_probe():
+        probe = asyncio.create_task(provider.ainvoke("hello"))
+        await asyncio.sleep(0.05)
+        assert endpoint.breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+    asyncio.run(cancel_probe())
+
+    # The next call gets the probe slot and its success closes the circuit
+    fast = ResilientChatProvider(ChatMock(), endpoint=endpoint)
+    assert fast.invoke("hello").content
+    assert endpoint.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,34 @@
+"""Shared ChainSets live exactly as long as the sessions using them."""
+from src import option_pool
+from src.config import ChatConfig, ChatProvider
+from src.session_manager import SessionManager
+
+
+def test_chain_set_closed_with_its_last_session(tmp_path):
+    manager = SessionManager()
+    config = ChatConfig(provider=ChatProvider.MOCK, cache_backend=None, option_pool_size=1,
+                        option_pool_dir=str(tmp_path))
+    first, engine = manager.create_session(config)
+    second, _ = manager.create_session(config)
+    pool = engine.chains.option_pool
+    assert manager.stats()["chain_sets"] == 1
+
+    manager.close_session(first)
+    assert manager.stats()["chain_sets"] == 1
+    assert pool in option_pool._pools.values()
+
+    manager.close_session(second)
+    assert manager.stats()["chain_sets"] == 0
+    assert engine.chains.executor._shutdown
+    assert pool not in option_pool._pools.values()
+    manager.close()
+
+
+def test_sessions_with_different_keys_do_not_outlive_their_chains():
+    manager = SessionManager(max_sessions=2)
+    for key in ("sk-a", "sk-b", "sk-c", "sk-d"):
+        config = ChatConfig(provider=ChatProvider.MOCK, api_key=key, cache_backend=None, option_pool_size=0)
+        manager.create_session(config)
+    # The two oldest sessions were evicted, taking their ChainSets with them
+    assert manager.stats() == {"sessions": 2, "chain_sets": 2, "max_sessions": 2}
+    manager.close()
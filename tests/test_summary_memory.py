@@ -0,0 +1,34 @@
+"""A summary update still running when the memory is reset is not applied."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.summary_memory import SummaryMemory
+
+
+def test_update_from_before_a_reset_is_discarded():
+    started, release = threading.Event(), threading.Event()
+    updates = []
+
+    def summarize(summary, turns):
+        if "old game" in turns:
+            started.set()
+            release.wait(5)
+        return f"summary of: {turns}"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        memory = SummaryMemory(summarize, executor, on_update=lambda summary, folded: updates.append(summary))
+        memory.fold([HumanMessage(content="old game"), AIMessage(content="the old story")])
+        assert started.wait(5)
+
+        # A new game starts while the old game's fold is running
+        memory.reset()
+        memory.fold([HumanMessage(content="new game")])
+        release.set()
+        memory.wait(5)
+
+    assert "old" not in memory.summary
+    assert "new game" in memory.summary
+    assert memory.folded == 1
+    assert all("old" not in summary for summary in updates)
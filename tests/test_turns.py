@@ -0,0 +1,82 @@
+"""A turn whose narration never finishes must not leave an unanswered message."""
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from src.config import ChatConfig, ChatProvider
+from src.game_engine import GameEngine
+
+
+@pytest.fixture
+def engine():
+    config = ChatConfig(provider=ChatProvider.MOCK, option_pool_size=0, cache_backend=None)
+    engine = GameEngine(config)
+    engine.offer_options()
+    engine.start_story("1")
+    yield engine
+    engine.close()
+
+
+def message_types(engine: GameEngine) -> list:
+    return [message.type for message in engine.messages]
+
+
+def test_closed_stream_keeps_the_narration_shown(engine):
+    stream = engine.stream_turn("I open the door")
+    shown = next(stream)
+    stream.close()
+
+    assert message_types(engine)[-2:] == ["human", "ai"]
+    assert engine.messages[-1].content == shown
+    assert engine.transcript.text.endswith(f"Assistant: {shown}")
+
+
+def test_failed_stream_withdraws_the_input(engine, monkeypatch):
+    before = list(engine.messages)
+    transcript = engine.transcript.text
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("provider down")
+        yield
+
+    monkeypatch.setattr(type(engine.chains.story_chain), "stream", fail)
+    with pytest.raises(RuntimeError):
+        list(engine.stream_turn("I open the door"))
+
+    assert engine.messages == before
+    assert engine.transcript.text == transcript
+
+
+def test_cancelled_async_stream_keeps_the_narration_shown(engine):
+    async def read_one_chunk():
+        stream = engine.astream_turn("I open the door")
+        shown = await stream.__anext__()
+        await stream.aclose()
+        await engine.await_state()
+        return shown
+
+    shown = asyncio.run(read_one_chunk())
+    assert message_types(engine)[-2:] == ["human", "ai"]
+    assert engine.messages[-1] == AIMessage(content=shown)
+
+
+def test_state_task_is_kept_until_it_finishes(engine, caplog):
+    async def failing_extraction(*args):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("state chain down")
+
+    engine._aextract_state = failing_extraction
+
+    async def play():
+        await engine.aprocess_turn("I open the door")
+        task = engine._pending_state
+        # A sync wait cannot await the task; the engine then drops its handle
+        engine.wait_for_state()
+        engine._pending_state = None
+        assert engine._state_tasks == {task}
+        await asyncio.sleep(0.1)
+
+    asyncio.run(play())
+    assert engine._state_tasks == set()
+    assert "state chain down" in caplog.text
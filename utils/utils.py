@@ -1,16 +1,26 @@
 from dotenv import load_dotenv
+import asyncio
 import os
-from typing import Optional
+import sys
+import threading
+from typing import Optional, Set
+
+_loaded_env_files: Set[Optional[str]] = set()
+_env_lock = threading.Lock()
 
 def load_environment_variables(env_file: Optional[str] = None) -> None:
     """
-    Load environment variables from .env file
+    Load environment variables from .env file, once per file per process
     
     Args:
         env_file: Optional path to .env file. If None, searches in current directory
     """
-    # Load the specified .env file or search in current directory
-    load_dotenv(dotenv_path=env_file)
+    with _env_lock:
+        if env_file in _loaded_env_files:
+            return
+        # Load the specified .env file or search in current directory
+        load_dotenv(dotenv_path=env_file)
+        _loaded_env_files.add(env_file)
 
 def get_api_key(key_name: str) -> str:
     """
@@ -29,3 +39,71 @@ def get_api_key(key_name: str) -> str:
     if not api_key:
         raise ValueError(f"{key_name} not found in environment variables")
     return api_key
+
+# Bytes read from stdin by ainput but not yet returned as lines
+_stdin_buffer = bytearray()
+
+def _take_line(eof: bool = False) -> Optional[str]:
+    """Pop the next complete line (or, at end of input, the rest) from the stdin buffer"""
+    end = _stdin_buffer.find(b"\n")
+    if end < 0:
+        if not eof:
+            return None
+        end = len(_stdin_buffer) - 1
+    raw = bytes(_stdin_buffer[:end + 1])
+    del _stdin_buffer[:end + 1]
+    return raw.decode(getattr(sys.stdin, "encoding", None) or "utf-8", errors="replace")
+
+async def ainput(prompt: str = "") -> str:
+    """
+    Read a line from the terminal without blocking the event loop
+
+    Reads the raw stdin file descriptor and splits lines itself, so lines
+    that arrive together (a paste, piped input) are all returned in turn
+    rather than stranded in the TextIOWrapper buffer.
+    
+    Args:
+        prompt: Text printed before waiting for input
+        
+    Returns:
+        str: The line entered, without the trailing newline
+        
+    Raises:
+        EOFError: If stdin is closed
+    """
+    print(prompt, end="", flush=True)
+    loop = asyncio.get_running_loop()
+    line = _take_line()
+    if line is None:
+        line_ready: asyncio.Future = loop.create_future()
+
+        def on_readable() -> None:
+            if line_ready.done():
+                return
+            try:
+                chunk = os.read(fd, 4096)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                line_ready.set_exception(e)
+                return
+            _stdin_buffer.extend(chunk)
+            ready = _take_line(eof=not chunk)
+            if ready is not None or not chunk:
+                line_ready.set_result(ready or "")
+
+        try:
+            fd = sys.stdin.fileno()
+            loop.add_reader(fd, on_readable)
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            # Event loops without reader support (e.g. Windows) fall back to a worker thread
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+        else:
+            try:
+                line = await line_ready
+            finally:
+                loop.remove_reader(fd)
+
+    if not line:
+        raise EOFError("stdin closed")
+    return line.rstrip("\n")